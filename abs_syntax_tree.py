@@ -18,7 +18,10 @@ class AST(object):
     """
     ASTs represent the operator-operand model.
     每一个 AST 节点都代表一个运算符和一个操作数
+    节点数量很多，所有节点都用 __slots__，不带 __dict__
     """
+    __slots__ = ()
+
     def __init__(self):
         pass
 
@@ -28,16 +31,24 @@ class BinOp(AST):
     二元运算符节点，也是非叶子节点，代表一个二元运算符
     比如 2 + 3 这个表达式，2 和 3 都是叶子节点，+ 是二元运算符节点
     """
+    __slots__ = ('left', 'token', 'right')
+
     def __init__(self, left, op, right):
         self.left = left
-        self.token = self.op = op
+        self.token = op
         self.right = right
 
+    @property
+    def op(self):
+        return self.token
+
 
 class Num(AST):
     """
     数字节点, 也是叶子节点，代表一个数字
     """
+    __slots__ = ('token', 'value')
+
     def __init__(self, token):
          self.token = token
          self.value = token.value
@@ -48,31 +59,49 @@ class UnaryOp(AST):
     一元运算符节点，也是非叶子节点，代表一个一元运算符
     比如 -2 这个表达式，- 是一元运算符节点，2 是叶子节点
     """
+    __slots__ = ('token', 'expr')
+
     def __init__(self, op, expr):
-        self.token = self.op = op
+        self.token = op
         self.expr = expr
 
+    @property
+    def op(self):
+        return self.token
+
 class Assign(AST):
     """
     赋值运算符节点，也是非叶子节点，代表一个赋值运算符
     比如 a = 2 这个表达式，a 是变量，2是值， 都是叶子节点，= 是赋值运算符节点
     """
+    __slots__ = ('left', 'token', 'right')
+
     def __init__(self, left, op, right):
         self.left = left
-        self.token = self.op = op
+        self.token = op
         self.right = right
 
+    @property
+    def op(self):
+        return self.token
+
 class Var(AST):
     """
     变量节点，也是叶子节点，代表一个变量
+    slot 是符号检查时分配的槽位号，解释器可以按槽位存取变量
     """
+    __slots__ = ('token', 'value', 'slot')
+
     def __init__(self, token):
         self.token = token
         self.value = token.value
+        self.slot = None
 
 class NoOp(AST):
-    pass
+    __slots__ = ()
 
 class Compound(AST):
+    __slots__ = ('children',)
+
     def __init__(self):
         self.children = []
\ No newline at end of file
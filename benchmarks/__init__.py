@@ -0,0 +1,16 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@file: __init__.py
+@author: amazing coder
+@date: 2026/10/18
+@desc: 基准测试：生成典型负载的程序，分别计时词法分析、语法分析、符号检查、求值四个阶段，
+结果保存成 JSON，并与保存的基线比较，超过阈值的变慢算作回归。
+eg:
+python -m benchmarks --output baseline.json
+python -m benchmarks --baseline baseline.json --threshold 0.2 --phase-threshold eval=0.3
+"""
+
+from benchmarks.workloads import WORKLOADS, generate
+from benchmarks.runner import PHASES, time_phases, run_workloads, save_results, load_results, compare
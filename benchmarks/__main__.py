@@ -0,0 +1,15 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@file: __main__.py
+@author: amazing coder
+@date: 2026/10/18
+@desc: python -m benchmarks 的入口
+"""
+
+import sys
+
+from benchmarks.runner import main
+
+sys.exit(main())
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@file: runner.py
+@author: amazing coder
+@date: 2026/10/18
+@desc: 分阶段计时、保存结果、与基线比较
+lex    : 词法分析器从头读到 EOF
+parse  : 在预先分好的 token 序列上做语法分析，不含词法分析
+symbol : SymbolTableBuilder 遍历语法树（不输出诊断信息）
+eval   : Interpreter 遍历语法树求值
+每个阶段重复 repeat 次取最短的时间。长链、深度嵌套的负载递归很深（最深与 token 数成正比），
+计时期间按 token 数临时调高递归深度限制。
+"""
+
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+
+from interpreter import EOF, Interpreter, SymbolTableBuilder
+from spi_lexer import LEXERS, TokenBuffer
+from spi_parser import PARSERS
+
+from benchmarks.workloads import WORKLOADS, generate
+
+PHASES = ('lex', 'parse', 'symbol', 'eval')
+# 结果文件格式版本
+RESULTS_VERSION = 1
+# 每个 token 最多对应的递归层数
+FRAMES_PER_TOKEN = 4
+
+
+def best_time(function, repeat):
+    """best wall time of repeat calls, and the last call's result; like timeit, GC is paused while timing"""
+    best = None
+    result = None
+    enabled = gc.isenabled()
+    for _ in range(repeat):
+        result = None
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            result = function()
+            elapsed = time.perf_counter() - start
+        finally:
+            if enabled:
+                gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def time_phases(text, lexer='regex', parser='parser', repeat=3):
+    """time each phase on text separately, return {'tokens': n, 'statements': n, 'phases': {phase: seconds}}"""
+    lexer_class = LEXERS[lexer]
+    parser_class = PARSERS[parser]
+
+    def lex():
+        analyzer = lexer_class(text)
+        count = 1
+        while analyzer.get_next_token().type != EOF:
+            count += 1
+        return count
+
+    buffer = TokenBuffer.tokenize(text)
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, FRAMES_PER_TOKEN * len(buffer) + 1000))
+    try:
+        phases = {}
+        phases['lex'], tokens = best_time(lex, repeat)
+        phases['parse'], tree = best_time(lambda: parser_class(buffer.reader()).parse(), repeat)
+        phases['symbol'], _ = best_time(lambda: SymbolTableBuilder(None).visit(tree), repeat)
+        phases['eval'], _ = best_time(lambda: Interpreter(None).visit(tree), repeat)
+    finally:
+        sys.setrecursionlimit(limit)
+    return {'tokens': tokens, 'statements': len(tree.children), 'phases': phases}
+
+
+def run_workloads(names=None, scale=1.0, repeat=3, lexer='regex', parser='parser', seed=0):
+    """run the named workloads (default: all), return the results document"""
+    results = {
+        'version': RESULTS_VERSION,
+        'python': platform.python_version(),
+        'lexer': lexer,
+        'parser': parser,
+        'scale': scale,
+        'repeat': repeat,
+        'workloads': {},
+    }
+    for name in names or WORKLOADS:
+        text = generate(name, scale, seed)
+        record = {'bytes': len(text)}
+        record.update(time_phases(text, lexer, parser, repeat))
+        results['workloads'][name] = record
+    return results
+
+
+def save_results(results, path):
+    with open(path, 'w') as out:
+        json.dump(results, out, indent=2, sort_keys=True)
+        out.write('\n')
+
+
+def load_results(path):
+    with open(path, 'r') as source:
+        results = json.load(source)
+    if results.get('version') != RESULTS_VERSION:
+        raise ValueError('{}: unsupported results version {!r}'.format(path, results.get('version')))
+    return results
+
+
+def compare(results, baseline, threshold=0.1, thresholds=None):
+    """
+    与基线比较，返回回归列表 [{'workload', 'phase', 'baseline', 'current', 'ratio'}]：
+    current > baseline * (1 + 阈值) 的阶段算回归。thresholds 是 {阶段: 阈值}，覆盖对应阶段的 threshold。
+    只比较两边都有的负载和阶段；规模、分析器不同的结果之间没有可比性，直接报错。
+    """
+    for key in ('scale', 'lexer', 'parser'):
+        if results.get(key) != baseline.get(key):
+            raise ValueError('baseline {} is {!r}, results have {!r}'.format(key, baseline.get(key), results.get(key)))
+    thresholds = thresholds or {}
+    regressions = []
+    for name, record in results['workloads'].items():
+        base_record = baseline['workloads'].get(name)
+        if base_record is None:
+            continue
+        for phase, seconds in record['phases'].items():
+            base_seconds = base_record['phases'].get(phase)
+            if not base_seconds:
+                continue
+            limit = thresholds.get(phase, threshold)
+            if seconds > base_seconds * (1 + limit):
+                regressions.append({'workload': name, 'phase': phase, 'baseline': base_seconds,
+                                    'current': seconds, 'ratio': seconds / base_seconds})
+    return regressions
+
+
+def parse_phase_threshold(value):
+    phase, _, limit = value.partition('=')
+    if phase not in PHASES or not limit:
+        raise argparse.ArgumentTypeError('expected PHASE=FRACTION with PHASE one of {}'.format(', '.join(PHASES)))
+    return phase, float(limit)
+
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                        description='Time lex/parse/symbol/eval on synthetic workloads.')
+    argparser.add_argument('workloads', nargs='*', metavar='workload', help='workloads to run (default: all of {})'.format(', '.join(sorted(WORKLOADS))))
+    argparser.add_argument('--scale', type=float, default=1.0, help='multiply every default workload size')
+    argparser.add_argument('--repeat', type=int, default=3, help='runs per phase, the best one counts')
+    argparser.add_argument('--lexer', choices=sorted(LEXERS), default='regex')
+    argparser.add_argument('--parser', choices=sorted(PARSERS), default='parser')
+    argparser.add_argument('--output', help='write the results as JSON to this file')
+    argparser.add_argument('--baseline', help='results JSON to compare against; exit 1 on a regression')
+    argparser.add_argument('--threshold', type=float, default=0.1,
+                           help='allowed slowdown as a fraction of the baseline time (default: 0.1)')
+    argparser.add_argument('--phase-threshold', type=parse_phase_threshold, action='append', default=[],
+                           metavar='PHASE=FRACTION', help='override --threshold for one phase')
+    args = argparser.parse_args(argv)
+    unknown = [name for name in args.workloads if name not in WORKLOADS]
+    if unknown:
+        argparser.error('unknown workload: {}'.format(', '.join(unknown)))
+    if args.repeat < 1:
+        argparser.error('--repeat must be >= 1')
+
+    baseline = load_results(args.baseline) if args.baseline else None
+    results = run_workloads(args.workloads, args.scale, args.repeat, args.lexer, args.parser)
+    if args.output:
+        save_results(results, args.output)
+
+    print('{:<14} {:>9} '.format('workload', 'tokens') + ' '.join('{:>10}'.format(phase) for phase in PHASES))
+    for name, record in results['workloads'].items():
+        print('{:<14} {:>9} '.format(name, record['tokens']) +
+              ' '.join('{:>9.4f}s'.format(record['phases'][phase]) for phase in PHASES))
+    if baseline is None:
+        return 0
+    regressions = compare(results, baseline, args.threshold, dict(args.phase_threshold))
+    for regression in regressions:
+        print('REGRESSION {workload} {phase}: {baseline:.4f}s -> {current:.4f}s ({ratio:.2f}x)'.format(**regression),
+              file=sys.stderr)
+    return 1 if regressions else 0
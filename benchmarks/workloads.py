@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@file: workloads.py
+@author: amazing coder
+@date: 2026/10/18
+@desc: 合成程序生成器，每个生成器 (size, seed) -> 源码文本，相同参数总是生成相同的文本
+"""
+
+import random
+
+
+def flat_chain(size, seed=0):
+    """one long flat expression: a single statement with size operands"""
+    rng = random.Random(seed)
+    operands = []
+    for i in range(size):
+        operands.append('a' if i % 3 else str(rng.randint(1, 9)))
+        operands.append(rng.choice('+-*'))
+    return 'a = 1\nb = ' + ' '.join(operands[:-1])
+
+
+def deep_nesting(size, seed=0):
+    """parentheses nested size levels deep"""
+    rng = random.Random(seed)
+    parts = []
+    for _ in range(size):
+        parts.append('({} {} '.format(rng.randint(1, 9), rng.choice('+-')))
+    return 'a = ' + ''.join(parts) + '1' + ')' * size
+
+
+def unary_run(size, seed=0):
+    """a long run of unary operators in front of one operand"""
+    rng = random.Random(seed)
+    return 'a = ' + ''.join(rng.choice('+-') for _ in range(size)) + '7'
+
+
+def wide_dependencies(size, seed=0, width=8):
+    """size assignments, each one averaging `width` randomly chosen earlier variables"""
+    rng = random.Random(seed)
+    lines = ['v{} = {}'.format(i, i + 1) for i in range(width)]
+    for i in range(width, size):
+        names = ['v{}'.format(rng.randrange(i)) for _ in range(width)]
+        lines.append('v{} = ({}) / {}'.format(i, ' + '.join(names), width))
+    return '\n'.join(lines)
+
+
+def deep_dependencies(size, seed=0):
+    """size assignments, each one depending on the previous one"""
+    rng = random.Random(seed)
+    lines = ['v0 = 1']
+    for i in range(1, size):
+        factor = rng.randint(2, 9)
+        lines.append('v{0} = v{1} * {2} - v{1} * {3} + {4}'.format(i, i - 1, factor, factor - 1, rng.randint(0, 9)))
+    return '\n'.join(lines)
+
+
+def float_heavy(size, seed=0):
+    """size assignments over float constants and float division"""
+    rng = random.Random(seed)
+    lines = ['x0 = 0.5']
+    for i in range(1, size):
+        lines.append('x{0} = x{1} * {2:.3f} + {3:.3f} / {4:.2f} - -{5:.4f}'.format(
+            i, rng.randrange(i), rng.uniform(0.5, 1.0), rng.uniform(0, 10), rng.uniform(1, 5), rng.random()))
+    return '\n'.join(lines)
+
+
+# 名字 -> (生成器, 默认规模)
+WORKLOADS = {
+    'flat-chain': (flat_chain, 200000),
+    'deep-nesting': (deep_nesting, 5000),
+    'unary-run': (unary_run, 20000),
+    'wide-deps': (wide_dependencies, 20000),
+    'deep-deps': (deep_dependencies, 20000),
+    'float-heavy': (float_heavy, 20000),
+}
+
+
+def generate(name, scale=1.0, seed=0):
+    """source text of workload name at scale times its default size"""
+    generator, size = WORKLOADS[name]
+    return generator(max(1, int(size * scale)), seed)
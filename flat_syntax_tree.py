@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@file: flat_syntax_tree.py
+@author: amazing coder
+@date: 2026/10/18
+@desc: 扁平化的抽象语法树，节点保存在几列平行数组里 (struct-of-arrays)
+每个节点占 kind / op / left / right 四列中的一格，Num 的常量和 Var/Assign 的变量名放在 pool 里。
+节点按后序排列：子节点总在父节点之前，语句按顺序排列，所以从头到尾扫一遍就能求值。
+eg: a = 2 + 3 * b
+index  kind     op   left  right
+0      NUM      -    0     -        pool[0] = 2
+1      NUM      -    1     -        pool[1] = 3
+2      VAR      -    2     -        pool[2] = 'b'
+3      BINOP    MUL  1     2
+4      BINOP    PLUS 0     3
+5      ASSIGN   -    3     4        pool[3] = 'a'
+6      COMPOUND -    0     1        children[0:1] = [5]
+"""
+
+from array import array
+
+from abs_syntax_tree import BinOp, Num, UnaryOp, Var, NoOp, Compound, Assign
+from spi_token import Token
+from interpreter import INTEGER, FLOAT, PLUS, MINUS, MUL, DIV, ID, ASSIGN, UNSET, SymbolTableBuilder
+
+
+NUM, VAR, UNARY, BINOP, ASSIGN_STMT, NOOP, COMPOUND = range(7)
+KIND_NAMES = ('Num', 'Var', 'UnaryOp', 'BinOp', 'Assign', 'NoOp', 'Compound')
+
+# op 列保存的是运算符在 OP_TYPES 中的下标
+OP_TYPES = (PLUS, MINUS, MUL, DIV)
+OP_CODES = {op_type: code for code, op_type in enumerate(OP_TYPES)}
+OP_PLUS, OP_MINUS, OP_MUL, OP_DIV = range(4)
+OP_VALUES = ('+', '-', '*', '/')
+
+
+class FlatAST(object):
+    """扁平 AST：节点是下标，root 是根节点（Compound）的下标"""
+    def __init__(self):
+        self.kind = array('B')
+        self.op = array('B')
+        self.left = array('i')
+        self.right = array('i')
+        self.children = array('i')
+        self.pool = []
+        self._pool_index = {}
+        self.root = -1
+
+    def __len__(self):
+        return len(self.kind)
+
+    def intern(self, value):
+        """return the pool index of value; 1 and 1.0 are kept apart"""
+        key = (type(value), value)
+        index = self._pool_index.get(key)
+        if index is None:
+            index = self._pool_index[key] = len(self.pool)
+            self.pool.append(value)
+        return index
+
+    def add(self, kind, op=0, left=-1, right=-1):
+        self.kind.append(kind)
+        self.op.append(op)
+        self.left.append(left)
+        self.right.append(right)
+        return len(self.kind) - 1
+
+    def to_tree(self):
+        """rebuild the abs_syntax_tree nodes"""
+        nodes = []
+        append = nodes.append
+        for index in range(len(self.kind)):
+            kind = self.kind[index]
+            if kind == NUM:
+                value = self.pool[self.left[index]]
+                append(Num(Token(FLOAT if isinstance(value, float) else INTEGER, value)))
+            elif kind == VAR:
+                append(Var(Token(ID, self.pool[self.left[index]])))
+            elif kind == UNARY:
+                op = self.op[index]
+                append(UnaryOp(op=Token(OP_TYPES[op], OP_VALUES[op]), expr=nodes[self.left[index]]))
+            elif kind == BINOP:
+                op = self.op[index]
+                append(BinOp(left=nodes[self.left[index]], op=Token(OP_TYPES[op], OP_VALUES[op]),
+                             right=nodes[self.right[index]]))
+            elif kind == ASSIGN_STMT:
+                append(Assign(left=Var(Token(ID, self.pool[self.left[index]])), op=Token(ASSIGN, '='),
+                              right=nodes[self.right[index]]))
+            elif kind == NOOP:
+                append(NoOp())
+            else:
+                compound = Compound()
+                start = self.left[index]
+                compound.children.extend(nodes[child] for child in self.children[start:start + self.right[index]])
+                append(compound)
+        return nodes[self.root]
+
+
+def flatten(tree):
+    """convert an abs_syntax_tree into a FlatAST (iterative post-order, no recursion limit)"""
+    flat = FlatAST()
+    # 已经展开的节点下标；共享的子树（DAG）按树展开，每次出现各占一份
+    results = []
+    stack = [(tree, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if not expanded:
+            stack.append((node, True))
+            if isinstance(node, BinOp):
+                stack.append((node.right, False))
+                stack.append((node.left, False))
+            elif isinstance(node, UnaryOp):
+                stack.append((node.expr, False))
+            elif isinstance(node, Assign):
+                stack.append((node.right, False))
+            elif isinstance(node, Compound):
+                stack.extend((child, False) for child in reversed(node.children))
+            continue
+        if isinstance(node, BinOp):
+            right = results.pop()
+            index = flat.add(BINOP, OP_CODES[node.token.type], results.pop(), right)
+        elif isinstance(node, Num):
+            index = flat.add(NUM, left=flat.intern(node.value))
+        elif isinstance(node, Var):
+            index = flat.add(VAR, left=flat.intern(node.value))
+        elif isinstance(node, UnaryOp):
+            index = flat.add(UNARY, OP_CODES[node.token.type], results.pop())
+        elif isinstance(node, Assign):
+            index = flat.add(ASSIGN_STMT, left=flat.intern(node.left.value), right=results.pop())
+        elif isinstance(node, Compound):
+            start = len(flat.children)
+            count = len(node.children)
+            if count:
+                flat.children.extend(results[-count:])
+                del results[-count:]
+            index = flat.add(COMPOUND, left=start, right=count)
+        else:
+            index = flat.add(NOOP)
+        results.append(index)
+    flat.root = results.pop()
+    return flat
+
+
+class FlatNodeVisitor(object):
+    """与 NodeVisitor 一样按节点类型分派到 visit_<Kind>，参数是 (flat, index)"""
+    def visit(self, flat, index):
+        method_name = 'visit_' + KIND_NAMES[flat.kind[index]]
+        visitor = getattr(self, method_name, self.generic_visit)
+        return visitor(flat, index)
+
+    def generic_visit(self, flat, index):
+        raise Exception('No visit_{} method'.format(KIND_NAMES[flat.kind[index]]))
+
+
+class FlatInterpreter(object):
+    """
+    FlatAST 解释器：节点是后序排列的，顺序扫描一遍节点数组就完成求值，没有递归也没有按类型分派方法。
+    """
+    def __init__(self, parser):
+        self.parser = parser
+        self.GLOBAL_SCOPE = {}
+        # 符号检查的诊断输出，None 表示关闭
+        self.trace = print
+
+    def check(self, tree):
+        """与 Interpreter.check 相同：parser 在解析时已经做过符号检查的，直接用它的符号表"""
+        symtab = getattr(self.parser, 'symtab', None)
+        if symtab is not None:
+            return symtab
+        symbol_builder = SymbolTableBuilder(self.trace)
+        symbol_builder.visit(tree)
+        return symbol_builder.symtab
+
+    def run(self, flat):
+        scope = self.GLOBAL_SCOPE
+        kinds, ops, lefts, rights, pool = flat.kind, flat.op, flat.left, flat.right, flat.pool
+        values = [None] * len(kinds)
+        for index, kind in enumerate(kinds):
+            if kind == BINOP:
+                left = values[lefts[index]]
+                right = values[rights[index]]
+                op = ops[index]
+                if op == OP_PLUS:
+                    values[index] = left + right
+                elif op == OP_MINUS:
+                    values[index] = left - right
+                elif op == OP_MUL:
+                    values[index] = left * right
+                else:
+                    values[index] = left / right
+            elif kind == VAR:
+                var_name = pool[lefts[index]]
+                val = scope.get(var_name, UNSET)
+                if val is UNSET:
+                    raise NameError(repr(var_name))
+                values[index] = val
+            elif kind == NUM:
+                values[index] = pool[lefts[index]]
+            elif kind == UNARY:
+                values[index] = -values[lefts[index]] if ops[index] == OP_MINUS else values[lefts[index]]
+            elif kind == ASSIGN_STMT:
+                scope[pool[lefts[index]]] = values[rights[index]]
+
+    def interpret(self):
+        tree = self.parser.parse()
+        self.check(tree)
+        flat = flatten(tree)
+        del tree
+        return self.run(flat)
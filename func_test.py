@@ -7,9 +7,36 @@
 @date: 2024/8/29
 @desc: 
 """
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+
+import pytest
+
 from spi_token import Token
-from abs_syntax_tree import Num, BinOp, UnaryOp
-from interpreter import Analyzer, Parser, Interpreter, INTEGER, MINUS
+from abs_syntax_tree import Num, BinOp, UnaryOp, Var, Assign, Compound
+from interpreter import Analyzer, Parser, Interpreter, SlotInterpreter, INTEGER, MINUS, EOF
+from spi_lexer import RegexAnalyzer, StreamAnalyzer, TokenBuffer, TOKEN_TYPES
+from spi_parser import PrattParser, HashConsParser, HashConsPrattParser, CheckingParser, CheckingPrattParser
+from flat_syntax_tree import flatten, FlatInterpreter
+from spi_closure import ClosureInterpreter
+from spi_bytecode import VMInterpreter, BytecodeCompiler, dumps, loads, run
+from spi_codegen import NativeInterpreter, to_python_source
+from spi_optimizer import ConstantFolder, DataflowOptimizer
+from spi_vector import VectorInterpreter
+from spi_cache import ProgramCache, CachedInterpreter, DiskCache, source_key
+import spi_marshal
+from spi_batch import dumps_record, evaluate_source, iter_files, run_files, main as main_batch
+from spi_server import EvaluationServer, load_test
+from spi_session import Session
+from spi_incremental import Document
+from spi_depgraph import DependencyGraph
+import benchmarks
+from spi_profile import Profiler
 
 def test_unary_op():
     """
@@ -54,6 +81,881 @@ def test_interpret_py_statements():
     print(interpreter.GLOBAL_SCOPE)
 
 
+def token_stream(lexer):
+    tokens = []
+    token = lexer.get_next_token()
+    while token.type != EOF:
+        tokens.append((token.type, token.value))
+        token = lexer.get_next_token()
+    return tokens
+
+
+def test_regex_analyzer():
+    """
+    测试正则词法分析器与 Analyzer 输出相同的 token 流
+    """
+    text = "a=1.34\n b1 = 2. + (a*3)/4-  -5 \\n c=a"
+    assert token_stream(RegexAnalyzer(text)) == token_stream(Analyzer(text))
+    assert token_stream(RegexAnalyzer('   ')) == []
+
+
+def test_stream_analyzer():
+    """
+    测试流式词法分析器：token 跨越块边界时结果不变
+    """
+    text = "a=1.34\n b\u00e91 = 22.5 + (a*3)/4-  -5 \\n c=a   "
+    expected = token_stream(RegexAnalyzer(text))
+    for chunk_size in range(1, 8):
+        assert token_stream(StreamAnalyzer(io.BytesIO(text.encode('utf-8')), chunk_size)) == expected
+        assert token_stream(StreamAnalyzer(io.StringIO(text), chunk_size)) == expected
+
+    interpreter = Interpreter(Parser(StreamAnalyzer(io.StringIO("a=1 b=a+2 a=b*2"), 2)))
+    interpreter.interpret_stream()
+    assert interpreter.GLOBAL_SCOPE == {'a': 6, 'b': 3}
+
+
+def test_token_buffer():
+    """
+    测试 TokenBuffer：token 流与 Analyzer 一致，并且可以反复解析
+    """
+    text = "a=1.34\n b1 = 2. + (a*3)/4-  -5 c=a"
+    buffer = TokenBuffer.tokenize(text)
+    assert token_stream(buffer.reader()) == token_stream(Analyzer(text))
+    assert len(buffer) == len(token_stream(Analyzer(text))) + 1
+    assert (buffer[0].type, buffer[0].value, buffer.offsets[2]) == ('ID', 'a', 2)
+    # 同一个词素共用一个 Token
+    assert buffer[0] is buffer[len(buffer) - 2] and len(buffer.tokens) < len(buffer)
+    assert [TOKEN_TYPES[code] for code in buffer.types] == [token[0] for token in token_stream(buffer.reader())] + [EOF]
+    for _ in range(2):
+        interpreter = Interpreter(Parser(buffer.reader()))
+        interpreter.interpret()
+        assert interpreter.GLOBAL_SCOPE == {'a': 1.34, 'b1': 2.0 + 1.34 * 3 / 4 + 5, 'c': 1.34}
+
+
+def tree_to_tuple(node):
+    if isinstance(node, Compound):
+        return tuple(tree_to_tuple(child) for child in node.children)
+    if isinstance(node, Assign):
+        return ('=', node.left.value, tree_to_tuple(node.right))
+    if isinstance(node, BinOp):
+        return (node.op.type, tree_to_tuple(node.left), tree_to_tuple(node.right))
+    if isinstance(node, UnaryOp):
+        return ('unary ' + node.op.type, tree_to_tuple(node.expr))
+    if isinstance(node, (Num, Var)):
+        return node.value
+    return type(node).__name__
+
+
+def test_pratt_parser():
+    """
+    测试 PrattParser 生成与 Parser 相同的语法树，并且支持很深的嵌套
+    """
+    text = "a=7 + 3 * (10 / (12 / (3 + 1) - 1)) b=5---2 c=-(a+b)*-+a/(2-b)-1.5 d=((a)) e=a*b/c-d+a*-b"
+    assert tree_to_tuple(PrattParser(RegexAnalyzer(text)).parse()) == tree_to_tuple(Parser(Analyzer(text)).parse())
+    for bad in ("a=(1+2", "a=1+", "a=()", "a=1)"):
+        for parser_class in (Parser, PrattParser):
+            try:
+                parser_class(RegexAnalyzer(bad)).parse()
+            except Exception as e:
+                assert str(e) == 'Invalid Syntax'
+            else:
+                assert False, bad
+
+    depth = 200000
+    tree = PrattParser(RegexAnalyzer('a=' + '(' * depth + '1' + ')' * depth)).parse()
+    assert tree.children[0].right.value == 1
+    node = PrattParser(RegexAnalyzer('a=5' + '-' * depth + '2')).parse().children[0].right
+    count = 0
+    node = node.right
+    while isinstance(node, UnaryOp):
+        node = node.expr
+        count += 1
+    assert count == depth - 1 and node.value == 2
+
+
+def test_flat_ast():
+    """
+    测试扁平 AST：还原出的语法树与原树相同，解释结果与 Interpreter 相同
+    """
+    text = "a=7 + 3 * (10 / (12 / (3 + 1) - 1)) b=5---2 c=-(a+b)*-+a/(2-b)-1.5 a=a*b/c-1 d=a"
+    tree = Parser(RegexAnalyzer(text)).parse()
+    flat = flatten(tree)
+    assert tree_to_tuple(flat.to_tree()) == tree_to_tuple(tree)
+    assert len(flat.pool) == len(set((type(v), v) for v in flat.pool))
+
+    interpreter = Interpreter(Parser(RegexAnalyzer(text)))
+    interpreter.interpret()
+    flat_interpreter = FlatInterpreter(Parser(RegexAnalyzer(text)))
+    flat_interpreter.interpret()
+    assert flat_interpreter.GLOBAL_SCOPE == interpreter.GLOBAL_SCOPE
+
+    # 用 parser 做过的符号检查，不再重复检查、不输出诊断信息；否则按 trace 输出
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        fused = FlatInterpreter(CheckingParser(RegexAnalyzer(text)))
+        fused.interpret()
+        traced = FlatInterpreter(Parser(RegexAnalyzer("a=1 b=a")))
+        lines = []
+        traced.trace = lines.append
+        traced.interpret()
+    assert fused.GLOBAL_SCOPE == interpreter.GLOBAL_SCOPE
+    assert output.getvalue() == ''
+    assert lines and all(line.startswith(('Define', 'Lookup')) for line in lines)
+    try:
+        FlatInterpreter(None).run(flatten(Parser(RegexAnalyzer("a=b")).parse()))
+    except NameError as e:
+        assert str(e) == "'b'"
+    else:
+        assert False
+
+
+def test_hash_cons_parser():
+    """
+    测试 hash-consing：相同的子表达式共享一个节点，变量重新赋值后结果仍然正确
+    """
+    text = "a=1 b=2 c=a+b d=a+b+c a=5 e=a+b+c"
+    for parser_class in (HashConsParser, HashConsPrattParser):
+        tree = parser_class(RegexAnalyzer(text)).parse()
+        assert tree_to_tuple(tree) == tree_to_tuple(Parser(RegexAnalyzer(text)).parse())
+        c, d, e = tree.children[2], tree.children[3], tree.children[5]
+        assert d.right.left is c.right and e.right is d.right
+
+        interpreter = Interpreter(parser_class(RegexAnalyzer(text)))
+        interpreter.interpret()
+        assert interpreter.GLOBAL_SCOPE == {'a': 5, 'b': 2, 'c': 3, 'd': 6, 'e': 10}
+
+
+def test_closure_interpreter():
+    """
+    测试闭包编译后端与 Interpreter 结果一致，可以重复执行
+    """
+    text = "a=7 + 3 * (10 / (12 / (3 + 1) - 1)) b=5---2 c=-(a+b)*-+a/(2-b)-1.5 a=a*b/c-1 d=2*a e=a-1"
+    interpreter = Interpreter(Parser(RegexAnalyzer(text)))
+    interpreter.interpret()
+    closure_interpreter = ClosureInterpreter(Parser(RegexAnalyzer(text)))
+    closure_interpreter.interpret()
+    assert closure_interpreter.GLOBAL_SCOPE == interpreter.GLOBAL_SCOPE
+    closure_interpreter.rerun()
+    assert closure_interpreter.GLOBAL_SCOPE == interpreter.GLOBAL_SCOPE
+    for bad, name in (("a=b", 'b'), ("a=a+1", 'a')):
+        try:
+            ClosureInterpreter(Parser(RegexAnalyzer(bad))).interpret()
+        except NameError as e:
+            assert str(e) == repr(name)
+        else:
+            assert False
+
+
+def test_bytecode_vm():
+    """
+    测试字节码虚拟机与 Interpreter 结果一致，字节码可以序列化
+    """
+    text = "a=7 + 3 * (10 / (12 / (3 + 1) - 1)) b=5---2 c=-(a+b)*-+a/(2-b)-1.5 a=a*b/c-1 d=2*a e=a-1 f=1.0+1"
+    interpreter = Interpreter(Parser(RegexAnalyzer(text)))
+    interpreter.interpret()
+    vm = VMInterpreter(Parser(RegexAnalyzer(text)))
+    vm.interpret()
+    assert vm.GLOBAL_SCOPE == interpreter.GLOBAL_SCOPE
+    assert vm.code_object.disassemble()[:4] == ['LOAD_CONST  0 (7)', 'LOAD_CONST  1 (3)', 'LOAD_CONST  2 (10)',
+                                                'LOAD_CONST  3 (12)']
+
+    code_object = loads(dumps(vm.code_object))
+    assert code_object == vm.code_object
+    scope = {}
+    run(code_object, scope)
+    assert scope == interpreter.GLOBAL_SCOPE
+    from spi_bytecode import CodeObject, LOAD_CONST, LOAD_NAME, STORE_NAME, BINARY_ADD
+    from array import array
+    corrupt = [dumps(CodeObject(array('I', code), [1], ['a'])) for code in (
+        [LOAD_CONST, 1, STORE_NAME, 0],                      # 常量下标越界
+        [LOAD_CONST, 0, STORE_NAME, 5],                      # 变量名下标越界
+        [LOAD_CONST, 0, BINARY_ADD, 0, STORE_NAME, 0],       # 栈弹空
+        [LOAD_CONST, 0, LOAD_NAME, 0],                       # 语句没有结束
+        [9, 0])]
+    for bad_data in [b'', b'SPIB', dumps(vm.code_object)[:-3]] + corrupt:
+        try:
+            loads(bad_data)
+        except ValueError:
+            pass
+        else:
+            assert False
+
+    for bad, error in (("a=b", NameError), ("a=a+1", NameError), ("a=1/0", ZeroDivisionError)):
+        for interpreter_class in (Interpreter, VMInterpreter):
+            try:
+                interpreter_class(Parser(RegexAnalyzer(bad))).interpret()
+            except error:
+                pass
+            else:
+                assert False
+
+
+def test_native_interpreter():
+    """
+    测试翻译成 CPython 代码对象执行的结果与 Interpreter 一致
+    """
+    text = "a=7 + 3 * (10 / (12 / (3 + 1) - 1)) b=5---2 c=-(a+b)*-+a/(2-b)-1.5 a=a*b/c-1 d=2*a e=a-1 f=1.0+1"
+    interpreter = Interpreter(Parser(RegexAnalyzer(text)))
+    interpreter.interpret()
+    native = NativeInterpreter(Parser(RegexAnalyzer(text)))
+    native.interpret()
+    assert native.GLOBAL_SCOPE == interpreter.GLOBAL_SCOPE
+    assert to_python_source(Parser(RegexAnalyzer("a=1 b=-(a+2)*3")).parse()) == 'a = 1\nb = -(a + 2) * 3'
+
+    for bad, name in (("a=b", 'b'), ("a=a+1", 'a')):
+        try:
+            NativeInterpreter(Parser(RegexAnalyzer(bad))).interpret()
+        except NameError as e:
+            assert str(e) == repr(name)
+        else:
+            assert False
+
+
+def test_constant_folder():
+    """
+    测试常量折叠：常量表达式折叠成一个 Num，结果和类型与不折叠时完全一致
+    """
+    tree = ConstantFolder().fold(Parser(RegexAnalyzer("a=7 + 3 * (10 / (12 / (3 + 1) - 1)) b=5---2")).parse())
+    assert tree_to_tuple(tree) == (('=', 'a', 22.0), ('=', 'b', 3))
+
+    folder = ConstantFolder()
+    tree = folder.fold(Parser(RegexAnalyzer("a=2 b=-(-a)*1 c=1*+a-0 d=a+0 e=a/1 f=a*1.0 g=1/0 h=---a")).parse())
+    assert tree_to_tuple(tree) == (('=', 'a', 2), ('=', 'b', 'a'), ('=', 'c', 'a'),
+                                   ('=', 'd', ('PLUS', 'a', 0)), ('=', 'e', ('DIV', 'a', 1)),
+                                   ('=', 'f', ('MUL', 'a', 1.0)), ('=', 'g', ('DIV', 1, 0)),
+                                   ('=', 'h', ('unary MINUS', 'a')))
+    assert folder.removed == 4 + 5 + 2
+
+    text = "a=-0.0 b=a-0 c=5---2.5 d=(1+2)*a/3 e=4/2 f=b*1"
+    interpreter = Interpreter(Parser(RegexAnalyzer(text)))
+    interpreter.interpret()
+    optimized = Interpreter(Parser(RegexAnalyzer(text)), passes=[ConstantFolder().fold])
+    optimized.interpret()
+    assert [(k, repr(v)) for k, v in optimized.GLOBAL_SCOPE.items()] == \
+        [(k, repr(v)) for k, v in interpreter.GLOBAL_SCOPE.items()]
+
+    # 折叠时溢出的表达式留到运行时，前面的语句照常执行
+    optimized = Interpreter(Parser(RegexAnalyzer("a=1 b=1{}/3".format('0' * 400))), passes=[ConstantFolder().fold])
+    try:
+        optimized.interpret()
+    except OverflowError:
+        pass
+    else:
+        assert False
+    assert optimized.GLOBAL_SCOPE == {'a': 1}
+
+
+def test_dataflow_optimizer():
+    """
+    测试死赋值删除和公共子表达式消除：结果不变，能抛异常的赋值不删
+    """
+    text = "a=1 b=2 c=a+b t=9 d=(a+b)*c t=a t=c-(a+b) a=5 e=a+b f=(a+b)*c g=t"
+    optimizer = DataflowOptimizer()
+    tree = optimizer.optimize(Parser(RegexAnalyzer(text)).parse())
+    assert tree_to_tuple(tree) == (('=', 'a', 1), ('=', 'b', 2), ('=', 'c', ('PLUS', 'a', 'b')),
+                                   ('=', 'd', ('MUL', 'c', 'c')), ('=', 't', ('MINUS', 'c', 'c')), ('=', 'a', 5),
+                                   ('=', 'e', ('PLUS', 'a', 'b')), ('=', 'f', ('MUL', 'e', 'c')), ('=', 'g', 't'))
+    assert optimizer.report() == {'dead_stores_removed': 2, 'subexpressions_reused': 3}
+
+    interpreter = Interpreter(Parser(RegexAnalyzer(text)))
+    interpreter.interpret()
+    optimized = Interpreter(Parser(RegexAnalyzer(text)), passes=[DataflowOptimizer().optimize])
+    optimized.interpret()
+    assert optimized.GLOBAL_SCOPE == interpreter.GLOBAL_SCOPE
+
+    # 后两个是 int 转 float 溢出：大整数除法、大整数与 float 相乘
+    for bad, error in (("a=a+1 a=2", NameError), ("b=0 a=1/b a=2", ZeroDivisionError),
+                       ("a=1{}/3 a=1".format('0' * 400), OverflowError),
+                       ("a={}*1.5 a=1".format('9' * 400), OverflowError)):
+        try:
+            Interpreter(Parser(RegexAnalyzer(bad)), passes=[DataflowOptimizer().optimize]).interpret()
+        except error:
+            pass
+        else:
+            assert False
+
+
+def test_slot_interpreter():
+    """
+    测试按槽位存取变量：结果与 Interpreter 相同，优化 pass 之后槽位依然有效
+    """
+    text = "a=1 b=2 c=a+b t=9 d=(a+b)*c t=a t=c-(a+b) a=5 e=a+b f=(a+b)*c g=t"
+    interpreter = Interpreter(Parser(RegexAnalyzer(text)))
+    interpreter.interpret()
+    slot_interpreter = SlotInterpreter(Parser(RegexAnalyzer(text)))
+    slot_interpreter.interpret()
+    assert slot_interpreter.GLOBAL_SCOPE == interpreter.GLOBAL_SCOPE
+    assert slot_interpreter.slot_names == ['a', 'b', 'c', 't', 'd', 'e', 'f', 'g']
+
+    tree = Parser(RegexAnalyzer("x=1 y=x+x x=y")).parse()
+    SlotInterpreter(None).check(tree)
+    assert [(child.left.slot, child.left.value) for child in tree.children] == [(0, 'x'), (1, 'y'), (0, 'x')]
+    assert tree.children[1].right.left.slot == 0
+
+    optimized = SlotInterpreter(Parser(RegexAnalyzer(text)),
+                                passes=[ConstantFolder().fold, DataflowOptimizer().optimize])
+    optimized.interpret()
+    assert optimized.GLOBAL_SCOPE == interpreter.GLOBAL_SCOPE
+
+    try:
+        SlotInterpreter(Parser(RegexAnalyzer("a=a+1"))).interpret()
+    except NameError:
+        pass
+    else:
+        assert False
+
+    for parser_class in (Parser, CheckingParser):
+        streamed = SlotInterpreter(parser_class(StreamAnalyzer(io.BytesIO(text.encode()), chunk_size=7)))
+        streamed.trace = None
+        streamed.interpret_stream()
+        assert streamed.GLOBAL_SCOPE == interpreter.GLOBAL_SCOPE
+        assert streamed.slot_names == ['a', 'b', 'c', 't', 'd', 'e', 'f', 'g']
+
+
+def test_checking_parser():
+    """
+    测试解析时做符号检查：语法树与槽位号与单独的 SymbolTableBuilder 相同，trace 回调收到诊断信息
+    """
+    text = "a=1 b=-a*(a+2) a=b/4 c=a-b"
+    expected = Parser(RegexAnalyzer(text)).parse()
+    Interpreter(None).check(expected)
+    for parser_class in (CheckingParser, CheckingPrattParser):
+        tree = parser_class(RegexAnalyzer(text)).parse()
+        assert tree_to_tuple(tree) == tree_to_tuple(expected)
+        assert [child.left.slot for child in tree.children] == [0, 1, 0, 2]
+        assert tree.children[3].right.right.slot == 1
+
+        interpreter = SlotInterpreter(parser_class(RegexAnalyzer(text)))
+        interpreter.interpret()
+        assert interpreter.GLOBAL_SCOPE == {'a': -0.75, 'b': -3, 'c': 2.25}
+
+        messages = []
+        parser_class(RegexAnalyzer("x=1 y=x"), trace=messages.append).parse()
+        assert messages == ['Define: VarSymbol:name=x: type=None', 'Define: VarSymbol:name=y: type=None',
+                            'Lookup: x']
+
+        try:
+            parser_class(RegexAnalyzer("a=1 b=a+c")).parse()
+        except NameError:
+            pass
+        else:
+            assert False
+
+
+def test_incremental_update():
+    """
+    测试按依赖图增量重算：只重算受影响的语句，值没变就不继续传播，出错时状态不变
+    """
+    text = "e=45 f=e*2 g=f-e h=7 k=h*h e=f+1 m=e-g z=0 w=1/(z+1)"
+    interpreter = Interpreter(Parser(RegexAnalyzer(text)), track_updates=True)
+    interpreter.interpret()
+    computed = []
+    compute = DependencyGraph.compute
+    DependencyGraph.compute = lambda graph, index, values: computed.append(index) or compute(graph, index, values)
+    try:
+        # 第一次更新也只重算受影响的语句，用的是 interpret() 记下的值
+        assert interpreter.update({'e': 50}) == {'f': 100, 'g': 50, 'e': 101, 'm': 51}
+    finally:
+        DependencyGraph.compute = compute
+    assert computed == [1, 2, 5, 6]
+    # 与改掉第一次赋值之后重新执行的结果相同
+    edited = Interpreter(Parser(RegexAnalyzer(text.replace("e=45", "e=50"))))
+    edited.interpret()
+    assert interpreter.GLOBAL_SCOPE == edited.GLOBAL_SCOPE
+
+    computed = []
+    interpreter.graph.compute = lambda index, values: computed.append(index) or compute(interpreter.graph, index, values)
+    assert interpreter.update({'h': 7}) == {}
+    assert interpreter.update({'h': 3}) == {'h': 3, 'k': 9}
+    assert computed == [4]
+
+    try:
+        interpreter.update({'z': -1})
+    except ZeroDivisionError:
+        pass
+    else:
+        assert False
+    assert interpreter.GLOBAL_SCOPE['z'] == 0
+    assert interpreter.update({'z': 1}) == {'z': 1, 'w': 0.5}
+
+    # 默认不记录每条语句的值，第一次 update() 时重算整个程序，结果相同
+    slot_interpreter = SlotInterpreter(Parser(RegexAnalyzer(text)))
+    slot_interpreter.interpret()
+    assert slot_interpreter.values is None
+    slot_interpreter.update({'e': 50, 'h': 3, 'z': 1})
+    assert slot_interpreter.GLOBAL_SCOPE == interpreter.GLOBAL_SCOPE
+
+
+def test_vector_interpreter():
+    """
+    测试按列求值：每一行的结果与标量解释器相同，除数中有 0 时抛 ZeroDivisionError
+    """
+    text = "a=1 b=2 k=3*4 c=(a+b)*k-a/b a=a+1 d=-c+k+a"
+    inputs = {'a': [1, 2, 3, 4], 'b': [5, 6.5, -7, 8]}
+    interpreter = VectorInterpreter(Parser(RegexAnalyzer(text)), inputs)
+    interpreter.interpret()
+    columns = {var_name: list(column) for var_name, column in interpreter.GLOBAL_SCOPE.items()}
+    assert sorted(columns) == ['a', 'b', 'c', 'd', 'k']
+    for row in range(4):
+        scalar = Interpreter(Parser(RegexAnalyzer(text)))
+        scalar.interpret()
+        scalar.update({var_name: column[row] for var_name, column in inputs.items()})
+        assert {var_name: column[row] for var_name, column in columns.items()} == scalar.GLOBAL_SCOPE
+
+    for bad, error in (("a=1 b=2 c=a/(b-2)", ZeroDivisionError), ("a=1 c=a", NameError)):
+        try:
+            VectorInterpreter(Parser(RegexAnalyzer(bad)), {'a': [1, 2], 'b': [3, 2]}).interpret()
+        except error:
+            pass
+        else:
+            assert False
+
+
+def test_vector_interpreter_numpy(monkeypatch):
+    """
+    测试 NumPy 路径：超过 32 个输入列，结果是数组，每一行与退回逐行执行的结果相同
+    """
+    np = pytest.importorskip('numpy')
+    import spi_vector
+    inputs = {'x{}'.format(i): [i, i + 1.5, -i] for i in range(40)}
+    text = ' '.join('x{}=0'.format(i) for i in range(40)) + ' s=' + '+'.join(inputs) + ' k=2 m=s/k'
+    interpreter = VectorInterpreter(Parser(RegexAnalyzer(text)), inputs)
+    interpreter.interpret()
+    scope = interpreter.GLOBAL_SCOPE
+    assert isinstance(scope['s'], np.ndarray) and scope['k'].shape == (3,)
+
+    monkeypatch.setattr(spi_vector, 'np', None)
+    fallback = VectorInterpreter(Parser(RegexAnalyzer(text)), inputs)
+    fallback.interpret()
+    assert fallback.GLOBAL_SCOPE['m'] == [sum(range(40)) / 2, (sum(range(40)) + 60) / 2, -sum(range(40)) / 2]
+    assert {var_name: list(column) for var_name, column in scope.items()} == fallback.GLOBAL_SCOPE
+
+
+def test_program_cache():
+    """
+    测试程序缓存：命中时跳过前端，超过容量按 LRU 淘汰，出错的程序不缓存
+    """
+    cache = ProgramCache(maxsize=2)
+    programs = ["a=1 b=a*2", "a=2 b=a*2", "a=3 b=a*2"]
+    for kind in ('tree', 'bytecode', 'closure'):
+        interpreter = CachedInterpreter(programs[0], kind, cache)
+        interpreter.interpret()
+        assert interpreter.GLOBAL_SCOPE == {'a': 1, 'b': 2}
+    assert cache.stats() == {'size': 2, 'maxsize': 2, 'hits': 0, 'misses': 3, 'evictions': 1}
+
+    cache = ProgramCache(maxsize=2)
+    first = cache.get(programs[0])
+    cache.get(programs[1])
+    assert cache.get(programs[0]) is first
+    cache.get(programs[2])
+    assert cache.get(programs[0]) is first
+    cache.get(programs[1])
+    assert (cache.hits, cache.misses, cache.evictions) == (2, 4, 2)
+
+    for _ in range(2):
+        try:
+            cache.get("a=b")
+        except NameError:
+            pass
+        else:
+            assert False
+    assert len(cache) == 2
+
+
+def test_disk_cache():
+    """
+    测试磁盘缓存：源码不变时从缓存文件加载，缓存文件损坏时当作未命中重新编译
+    """
+    text = "a=1 b=-a*(a+2.5) c=b/4"
+    with tempfile.TemporaryDirectory() as directory:
+        cache = DiskCache(os.path.join(directory, '__spicache__'))
+        compiled = cache.get(text)
+        assert DiskCache(cache.directory).get(text) == compiled
+        assert os.listdir(cache.directory) == [os.path.basename(cache.path(source_key(text)))]
+
+        with open(cache.path(source_key(text)), 'r+b') as cache_file:
+            cache_file.truncate(40)
+        reloaded = DiskCache(cache.directory)
+        assert reloaded.get(text) == compiled
+        assert (reloaded.hits, reloaded.misses) == (0, 1)
+        assert DiskCache(cache.directory).get(text + " d=c") != compiled
+
+        # 改坏一个操作数：当作未命中，重新编译并覆盖缓存文件
+        path = cache.path(source_key(text))
+        with open(path, 'rb') as cache_file:
+            original = cache_file.read()
+        operand = original.index(compiled.code.tobytes()) + 4
+        with open(path, 'wb') as cache_file:
+            cache_file.write(original[:operand] + b'\xff' + original[operand + 1:])
+        reloaded = DiskCache(cache.directory)
+        assert reloaded.get(text) == compiled
+        assert (reloaded.hits, reloaded.misses) == (0, 1)
+        with open(path, 'rb') as cache_file:
+            assert cache_file.read() == original
+        scope = {}
+        run(DiskCache(cache.directory).get(text), scope)
+        assert scope == {'a': 1, 'b': -3.5, 'c': -0.875}
+
+
+def random_program(rng, statements):
+    """a random valid program; every variable is assigned before it is read"""
+    lines = []
+    defined = []
+
+    def expr(depth):
+        choice = rng.random()
+        if depth > 5 or choice < 0.3:
+            if defined and rng.random() < 0.5:
+                return rng.choice(defined)
+            return rng.choice((str(rng.randint(0, 1 << 70)), '{}.{}'.format(rng.randint(0, 99), rng.randint(0, 9))))
+        if choice < 0.4:
+            return rng.choice('+-') + expr(depth + 1)
+        if choice < 0.5:
+            return '(' + expr(depth + 1) + ')'
+        return '{} {} {}'.format(expr(depth + 1), rng.choice('+-*/'), expr(depth + 1))
+
+    for _ in range(statements):
+        target = 'v{}'.format(rng.randint(0, 200))
+        lines.append('{} = {}'.format(target, expr(0)))
+        defined.append(target)
+    return '\n'.join(lines)
+
+
+def test_ast_marshal():
+    """
+    测试语法树的二进制格式：大的随机程序 dump/load 之后与 Parser.parse 的结果相同，共享节点保持共享
+    """
+    rng = random.Random(20261018)
+    for statements in (1, 50, 3000):
+        text = random_program(rng, statements)
+        tree = Parser(RegexAnalyzer(text)).parse()
+        loaded = spi_marshal.load(spi_marshal.dump(tree))
+        assert tree_to_tuple(loaded) == tree_to_tuple(tree)
+        assert BytecodeCompiler().compile(loaded) == BytecodeCompiler().compile(tree)
+        assert spi_marshal.dump(loaded) == spi_marshal.dump(tree)
+
+    text = "a=1 b=(a+2)*(a+2) c=(a+2)*(a+2)-b"
+    dag = HashConsParser(RegexAnalyzer(text)).parse()
+    loaded = spi_marshal.load(spi_marshal.dump(dag))
+    assert loaded.children[1].right.left is loaded.children[1].right.right
+    assert loaded.children[2].right.left is loaded.children[1].right
+    assert len(spi_marshal.dump(dag)) < len(spi_marshal.dump(Parser(RegexAnalyzer(text)).parse()))
+    interpreter = Interpreter(None)
+    interpreter.visit(loaded)
+    assert interpreter.GLOBAL_SCOPE == {'a': 1, 'b': 9, 'c': 0}
+
+    data = spi_marshal.dump(dag)
+    for bad in (b'', data[:-1], data + b'\0', b'SPIA\x63' + data[5:], data[:-2] + b'\x7f\x01'):
+        try:
+            spi_marshal.load(bad)
+        except ValueError:
+            pass
+        else:
+            assert False
+
+
+def test_batch_runner():
+    """
+    测试多进程批量执行：每个文件一条结果，出错的文件记录错误信息
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        os.mkdir(os.path.join(directory, 'sub'))
+        sources = {'a.txt': "a=1 b=a*2", os.path.join('sub', 'b.txt'): "x=2.5 y=-x",
+                   'c.txt': "c=d", 'd.txt': "e=1/0", 'skip.py': "a=1"}
+        for name, text in sources.items():
+            with open(os.path.join(directory, name), 'w') as source:
+                source.write(text)
+        paths = list(iter_files([directory, os.path.join(directory, 'missing.txt')]))
+        assert [os.path.relpath(path, directory) for path in paths] == \
+            ['a.txt', 'c.txt', 'd.txt', os.path.join('sub', 'b.txt'), 'missing.txt']
+
+        records = {os.path.relpath(record['file'], directory): record
+                   for record in run_files(paths, workers=2, chunksize=2)}
+        assert records['a.txt'] == {'file': paths[0], 'ok': True, 'scope': {'a': 1, 'b': 2}}
+        assert records[os.path.join('sub', 'b.txt')]['scope'] == {'x': 2.5, 'y': -2.5}
+        assert records['c.txt']['error'] == "NameError: 'd'"
+        assert records['d.txt']['error'].startswith('ZeroDivisionError')
+        assert records['missing.txt']['error'].startswith('FileNotFoundError')
+
+        # 结果取走之前最多提交 window 个任务，不会一次读完所有输入
+        consumed = []
+
+        def lazy_paths():
+            for path in paths * 5:
+                consumed.append(path)
+                yield path
+        results = run_files(lazy_paths(), workers=1, chunksize=1, window=2)
+        next(results)
+        assert len(consumed) <= 3
+        assert len(list(results)) == len(paths) * 5 - 1
+
+    # inf / nan 不是合法的 JSON，写成字符串
+    record = {'file': 'f.txt', 'ok': True, 'scope': evaluate_source("a={}. b=-a c=a+b d=1".format('9' * 400))}
+    assert json.loads(dumps_record(record))['scope'] == {'a': 'inf', 'b': '-inf', 'c': 'nan', 'd': 1}
+
+    # 结果中的整数太长写不成 JSON 时，这个文件记为失败，其余文件照常输出
+    with tempfile.TemporaryDirectory() as directory:
+        for name, text in (('big.txt', "a={} b=a*a".format('9' * 3000)), ('small.txt', "c=3")):
+            with open(os.path.join(directory, name), 'w') as source:
+                source.write(text)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(io.StringIO()):
+            assert main_batch([directory, '--workers', '1']) == 1
+        records = {os.path.basename(record['file']): record
+                   for record in map(json.loads, output.getvalue().splitlines())}
+    assert records['small.txt']['scope'] == {'c': 3}
+    assert not records['big.txt']['ok'] and records['big.txt']['error'].startswith('ValueError')
+
+
+def test_evaluation_server():
+    """
+    测试求值服务：相同的并发请求合并成一次求值，压测客户端统计请求数和失败数
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    async def scenario():
+        server = EvaluationServer(executor=ThreadPoolExecutor(2), max_pending=8)
+        listener = await server.start(port=0)
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            results = await asyncio.gather(*(server.evaluate("a=1 b=a+1") for _ in range(5)))
+            assert results == [{'ok': True, 'scope': {'a': 1, 'b': 2}}] * 5
+            assert (server.stats['coalesced'], server.stats['evaluated']) == (4, 1)
+
+            report = await load_test(["a=1 b=a*3", "x=2.5", "c=d"], requests=60, connections=4, port=port)
+            assert (report['requests'], report['errors']) == (60, 20)
+            assert report['p99'] >= report['p50'] > 0
+
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b'{"source": 1}\n{"id": "x", "source": "a=2 b=a/4", "kind": "tree"}\n')
+            await writer.drain()
+            responses = [json.loads(await reader.readline()) for _ in range(2)]
+            writer.close()
+            await writer.wait_closed()
+            assert {'id': 'x', 'ok': True, 'scope': {'a': 2, 'b': 0.5}} in responses
+            assert any(response['id'] is None and not response['ok'] for response in responses)
+            assert (await server.handle_request(b'{"id": 7, "source": "a=1", "kind": "nope"}'))['id'] == 7
+
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(json.dumps({'id': 8, 'source': 'a={}. b=a-a'.format('9' * 400)}).encode() + b'\n')
+            await writer.drain()
+            line = await reader.readline()
+            writer.close()
+            await writer.wait_closed()
+            assert b'Infinity' not in line and b'NaN' not in line
+            assert json.loads(line) == {'id': 8, 'ok': True, 'scope': {'a': 'inf', 'b': 'nan'}}
+
+            # 结果中的整数太长写不成 JSON：回复一条错误，不能让客户端一直等
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(json.dumps({'id': 9, 'source': 'a={} b=a*a'.format('9' * 3000)}).encode() + b'\n')
+            await writer.drain()
+            response = json.loads(await asyncio.wait_for(reader.readline(), 10))
+            writer.close()
+            await writer.wait_closed()
+            assert response['id'] == 9 and not response['ok'] and response['error'].startswith('ValueError')
+        finally:
+            await server.close()
+
+    asyncio.run(scenario())
+
+
+def test_evaluation_server_process_pool():
+    """
+    测试默认的进程池：连接数多于 max_pending 时空闲连接不占名额；
+    工作进程不继承客户端连接，服务端关闭连接后客户端能读到 EOF
+    """
+    async def scenario():
+        server = EvaluationServer(workers=2, max_pending=4, max_line=256)
+        listener = await server.start(port=0)
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            # 第一个请求时进程池才启动工作进程，这时这个连接已经打开
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b'{"id": 1, "source": "x=2"}\n')
+            await writer.drain()
+            response = json.loads(await asyncio.wait_for(reader.readline(), 10))
+            assert response == {'id': 1, 'ok': True, 'scope': {'x': 2}}
+            writer.write(b'{"id": 2, "source": "' + b'1' * 300 + b'"}\n')
+            await writer.drain()
+            assert b'too long' in await asyncio.wait_for(reader.readline(), 10)
+            assert await asyncio.wait_for(reader.read(), 10) == b''
+            writer.close()
+
+            report = await load_test(["a=1 b=a*3", "c=d"], requests=80, connections=8, port=port)
+            assert (report['requests'], report['errors']) == (80, 40)
+            # 连接都已关闭，名额全部归还
+            assert server._slots._value == 4
+
+            # 空闲的连接比名额多，新的连接照样得到响应
+            idle = [await asyncio.open_connection('127.0.0.1', port) for _ in range(6)]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b'{"id": 3, "source": "y=3"}\n')
+            await writer.drain()
+            response = json.loads(await asyncio.wait_for(reader.readline(), 10))
+            assert response == {'id': 3, 'ok': True, 'scope': {'y': 3}}
+            writer.close()
+            for _, idle_writer in idle:
+                idle_writer.close()
+        finally:
+            await server.close()
+
+    asyncio.run(scenario())
+
+
+def test_session():
+    """
+    测试会话：变量和符号在多次提交之间保留，出错的提交不执行、撤销新定义的符号
+    """
+    session = Session()
+    assert session.submit("a=1") == {'a': 1}
+    assert session.submit("b=a*2 \\n c=b+a") == {'b': 2, 'c': 3}
+    assert session.submit("") == {}
+    for bad, error in (("d=1 e=zz", NameError), ("d=(1", Exception), ("d=1 5", Exception)):
+        try:
+            session.submit(bad)
+        except error:
+            pass
+        else:
+            assert False
+        assert session.symtab.lookup('d') is None
+    try:
+        session.submit("a=2 z=a/0 b=5")
+    except ZeroDivisionError:
+        pass
+    else:
+        assert False
+    assert session.scope == {'a': 2, 'b': 2, 'c': 3}
+    assert session.submit("a=a+b") == {'a': 4}
+    assert session.statements == 5
+
+
+def test_incremental_reparse():
+    """
+    测试编辑后增量重新解析：结果与整体解析相同，只重新分析编辑附近的语句，原来的节点保留
+    """
+    text = ' '.join('v{} = v{} * 2 + {}'.format(i, i - 1, i) if i else 'v0 = 1' for i in range(2000))
+    document = Document(text)
+    tree = document.tree
+    kept = tree.children[1500]
+    edits = [
+        (text.index('v1000 = v999 * 2') + 15, 1, '7'),      # 改一个数字
+        (text.index(' v1200 ='), 0, ' c = v3 - 1'),        # 插入一条语句
+        (text.index(' v1300 ='), 1, ''),                   # 删掉语句之间的空格："1299v1300" 仍然是两个 token
+        (text.index('v1400 ='), len('v1400 = v1399 * 2 + 1400 '), ''),   # 删除一条语句
+    ]
+    for offset, removed, inserted in edits:
+        expected = text[:offset] + inserted + text[offset + removed:]
+        assert document.edit(offset, removed, inserted) is tree
+        assert document.reparsed < 100
+        text = expected
+        assert tree_to_tuple(tree) == tree_to_tuple(Parser(RegexAnalyzer(text)).parse())
+    assert kept in tree.children and len(tree.children) == 2000
+    assert tree.children[1200].left.value == 'c'
+
+    # 编辑后有语法错误：异常与 Parser.parse 相同，语法树保持不变，改正之后恢复
+    offset = text.index('v5 =') + 4
+    try:
+        document.edit(offset, 0, '(')
+    except Exception as e:
+        assert str(e) == 'Invalid Syntax'
+    else:
+        assert False
+    assert not document.valid and document.tree is tree
+    document.edit(offset, 1, '')
+    assert document.valid and tree_to_tuple(tree) == tree_to_tuple(Parser(RegexAnalyzer(text)).parse())
+
+    # 删掉空格后两个变量名粘成一个："a=xb=1" 是语法错误
+    document = Document("a=x b=1")
+    try:
+        document.edit(3, 1, '')
+    except Exception as e:
+        assert str(e) == 'Invalid Syntax'
+    else:
+        assert False
+
+
+def test_lazy_evaluation():
+    """
+    测试按需求值：只计算需要的变量依赖的语句，取每个变量在使用之前的最后一次赋值
+    """
+    text = "a=1 b=a+1 a=10 c=a*b z=0 bad=1/z d=c-b e=d*d"
+    interpreter = Interpreter(Parser(RegexAnalyzer(text)))
+    assert interpreter.interpret_lazy(['d', 'a']) == {'d': 18, 'a': 10}
+    assert interpreter.GLOBAL_SCOPE == {'d': 18, 'a': 10}
+    assert sorted(interpreter.graph.memo) == [0, 1, 2, 3, 6]
+
+    slot_interpreter = SlotInterpreter(Parser(RegexAnalyzer(text)))
+    assert slot_interpreter.interpret_lazy(['e']) == {'e': 324}
+    assert slot_interpreter.GLOBAL_SCOPE == {'e': 324}
+
+    for names, error in ((['bad'], ZeroDivisionError), (['nope'], NameError)):
+        try:
+            Interpreter(Parser(RegexAnalyzer(text))).interpret_lazy(names)
+        except error:
+            pass
+        else:
+            assert False
+
+
+def test_benchmarks():
+    """
+    测试基准负载都是合法的程序，分阶段计时的结果可以保存、加载，并按阈值比较出回归
+    """
+    for name in benchmarks.WORKLOADS:
+        text = benchmarks.generate(name, scale=0.001)
+        assert text == benchmarks.generate(name, scale=0.001)
+        interpreter = Interpreter(Parser(RegexAnalyzer(text)))
+        interpreter.trace = None
+        interpreter.interpret()
+
+    results = benchmarks.run_workloads(['deep-deps', 'unary-run'], scale=0.005, repeat=1)
+    assert set(results['workloads']['deep-deps']['phases']) == set(benchmarks.PHASES)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'baseline.json')
+        benchmarks.save_results(results, path)
+        baseline = benchmarks.load_results(path)
+    assert benchmarks.compare(results, baseline) == []
+
+    slower = json.loads(json.dumps(results))
+    slower['workloads']['deep-deps']['phases']['eval'] *= 1.5
+    slower['workloads']['deep-deps']['phases']['lex'] *= 1.05
+    regressions = benchmarks.compare(slower, baseline, threshold=0.2)
+    assert [(r['workload'], r['phase']) for r in regressions] == [('deep-deps', 'eval')]
+    assert benchmarks.compare(slower, baseline, threshold=0.2, thresholds={'eval': 0.6}) == []
+    assert len(benchmarks.compare(slower, baseline, threshold=0.01)) == 2
+
+
+def test_profiler():
+    """
+    测试性能剖析：结果与 interpret() 相同，节点访问次数、token 数正确，结束后去掉插桩，
+    导出的 JSON 与折叠栈格式正确
+    """
+    text = 'a = 2 b = -a * (a + 3) c = b / 4 - a'
+    profiler = Profiler()
+    interpreter = SlotInterpreter(Parser(RegexAnalyzer(text)))
+    interpreter.trace = None
+    profiler.profile(interpreter)
+    assert interpreter.GLOBAL_SCOPE == {'a': 2, 'b': -10, 'c': -4.5}
+    assert 'visit' not in vars(interpreter)
+    assert 'get_next_token' not in vars(interpreter.parser.analyzer)
+
+    data = json.loads(profiler.to_json())
+    assert list(data['phases']) == ['lex', 'parse', 'symbol', 'eval']
+    assert data['tokens'] == len(TokenBuffer.tokenize(text))
+    assert {name: record['count'] for name, record in data['nodes'].items()} == \
+        {'Compound': 1, 'Assign': 3, 'BinOp': 4, 'UnaryOp': 1, 'Num': 3, 'Var': 4}
+    assert data['nodes']['Compound']['total'] >= data['nodes']['Assign']['total']
+
+    for line in profiler.collapsed().splitlines():
+        path, micros = line.rsplit(' ', 1)
+        assert path.startswith('interpret;') and int(micros) > 0
+    assert 'interpret;eval;Compound;Assign;BinOp;UnaryOp;Var' in profiler.collapsed()
+
+    shallow = Profiler(max_depth=2)
+    shallow.profile(Interpreter(Parser(RegexAnalyzer(text)), passes=[ConstantFolder().fold]))
+    assert 'optimize' in shallow.phases
+    assert all(line.count(';') <= 3 for line in shallow.collapsed().splitlines())
+
 
 if __name__ == '__main__':
     test_interpret_py_statements()
\ No newline at end of file
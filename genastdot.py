@@ -14,6 +14,8 @@ class ASTVisualizer(NodeVisitor):
     def __init__(self, parser):
         self.parser = parser
         self.ncount = 1
+        # 节点没有 __dict__，节点编号按 id(node) 记录
+        self.nums = {}
         self.dot_header = [textwrap.dedent("""\
         digraph astgraph {
           node [shape=circle, fontsize=12, fontname="Courier", height=.1];
@@ -24,69 +26,75 @@ class ASTVisualizer(NodeVisitor):
         self.dot_body = []
         self.dot_footer = ['}']
 
+    def visit(self, node):
+        # hash-consing 生成的 DAG 中共享的节点只画一次
+        if id(node) in self.nums:
+            return
+        return super().visit(node)
+
     def visit_Num(self, node):
         s = '  node{} [label="{}"]\n'.format(self.ncount, node.token.value)
         self.dot_body.append(s)
-        node._num = self.ncount
+        self.nums[id(node)] = self.ncount
         self.ncount += 1
 
     def visit_BinOp(self, node):
         s = '  node{} [label="{}"]\n'.format(self.ncount, node.op.value)
         self.dot_body.append(s)
-        node._num = self.ncount
+        self.nums[id(node)] = self.ncount
         self.ncount += 1
 
         self.visit(node.left)
         self.visit(node.right)
 
         for child_node in (node.left, node.right):
-            s = '  node{} -> node{}\n'.format(node._num, child_node._num)
+            s = '  node{} -> node{}\n'.format(self.nums[id(node)], self.nums[id(child_node)])
             self.dot_body.append(s)
 
     def visit_UnaryOp(self, node):
         s = '  node{} [label="unary {}"]\n'.format(self.ncount, node.op.value)
         self.dot_body.append(s)
-        node._num = self.ncount
+        self.nums[id(node)] = self.ncount
         self.ncount += 1
 
         self.visit(node.expr)
-        s = '  node{} -> node{}\n'.format(node._num, node.expr._num)
+        s = '  node{} -> node{}\n'.format(self.nums[id(node)], self.nums[id(node.expr)])
         self.dot_body.append(s)
 
     def visit_Compound(self, node):
         s = '  node{} [label="Compound"]\n'.format(self.ncount)
         self.dot_body.append(s)
-        node._num = self.ncount
+        self.nums[id(node)] = self.ncount
         self.ncount += 1
 
         for child in node.children:
             self.visit(child)
-            s = '  node{} -> node{}\n'.format(node._num, child._num)
+            s = '  node{} -> node{}\n'.format(self.nums[id(node)], self.nums[id(child)])
             self.dot_body.append(s)
 
     def visit_Assign(self, node):
         s = '  node{} [label="{}"]\n'.format(self.ncount, node.op.value)
         self.dot_body.append(s)
-        node._num = self.ncount
+        self.nums[id(node)] = self.ncount
         self.ncount += 1
 
         self.visit(node.left)
         self.visit(node.right)
 
         for child_node in (node.left, node.right):
-            s = '  node{} -> node{}\n'.format(node._num, child_node._num)
+            s = '  node{} -> node{}\n'.format(self.nums[id(node)], self.nums[id(child_node)])
             self.dot_body.append(s)
 
     def visit_Var(self, node):
         s = '  node{} [label="{}"]\n'.format(self.ncount, node.value)
         self.dot_body.append(s)
-        node._num = self.ncount
+        self.nums[id(node)] = self.ncount
         self.ncount += 1
 
     def visit_NoOp(self, node):
         s = '  node{} [label="NoOp"]\n'.format(self.ncount)
         self.dot_body.append(s)
-        node._num = self.ncount
+        self.nums[id(node)] = self.ncount
         self.ncount += 1
 
 
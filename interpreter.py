@@ -19,6 +19,7 @@ v10.0 : handle variable not defined error
 """
 
 import keyword
+import os
 from abs_syntax_tree import BinOp, Num, UnaryOp, Var, NoOp, Compound, Assign
 from spi_token import Token
 from spi_symbol import VarSymbol, SymbolTable
@@ -26,6 +27,8 @@ from spi_symbol import VarSymbol, SymbolTable
 
 INTEGER, FLOAT, PLUS, EOF, MINUS, MUL, DIV, LPAREN, RPAREN, ID, ASSIGN, REPL = 'INTEGER', 'FLOAT', 'PLUS', 'EOF', 'MINUS', 'MUL', 'DIV', 'LPAREN', 'RPAREN', 'ID', 'ASSIGN', 'REPL'
 PYTHON_RESERVED_KEYWORDS = {key: Token(key, key) for key in keyword.kwlist}
+# 变量还没有赋值时的占位值
+UNSET = object()
 
 class Analyzer(object):
     """Lexical analyzer 表达式的语法解析器，用于将表达式解析成token流"""
@@ -253,6 +256,15 @@ class Parser(object):
         else:
             self.error()
 
+    def iter_statements(self):
+        """yield the program statements one by one instead of building a Compound,
+        so the statements can be executed while the source is still being read."""
+        yield self.statement()
+        while self.current_token.type == ID:
+            yield self.statement()
+        if self.current_token.type != EOF:
+            self.error()
+
     def parse(self):
         node = self.program()
         if self.current_token.type != EOF:
@@ -271,32 +283,46 @@ class NodeVisitor(object):
 
 
 class Interpreter(NodeVisitor):
-    def __init__(self, parser):
+    def __init__(self, parser, passes=(), track_updates=False):
         self.parser = parser
         self.GLOBAL_SCOPE = {}
+        # 符号检查之后、求值之前依次执行的优化 pass，每个 pass 是 tree -> tree 的函数
+        self.passes = list(passes)
+        # 符号检查的诊断输出，None 表示关闭
+        self.trace = print
+        # interpret() 时是否记下每条赋值语句算出的值：第一次 update() 时依赖图直接使用，不必把整个程序重算一遍，
+        # 代价是与语句数成正比的内存，所以默认关闭
+        self.track_updates = track_updates
+        # interpret() 执行的语法树和记下的值，以及第一次 update() 时才建立的依赖图
+        self.tree = None
+        self.values = None
+        self.graph = None
 
     def visit_BinOp(self, node):
-        if node.op.type == PLUS:
+        op_type = node.token.type
+        if op_type == PLUS:
             return self.visit(node.left) + self.visit(node.right)
-        elif node.op.type == MINUS:
+        elif op_type == MINUS:
             return self.visit(node.left) - self.visit(node.right)
-        elif node.op.type == MUL:
+        elif op_type == MUL:
             return self.visit(node.left) * self.visit(node.right)
-        elif node.op.type == DIV:
+        elif op_type == DIV:
             return self.visit(node.left) / self.visit(node.right)
 
     def visit_Num(self, node):
         return node.token.value
 
     def visit_UnaryOp(self, node):
-        if node.op.type == PLUS:
+        op_type = node.token.type
+        if op_type == PLUS:
             return self.visit(node.expr)
-        elif node.op.type == MINUS:
+        elif op_type == MINUS:
             return -self.visit(node.expr)
 
     def visit_Assign(self, node):
         var_name = node.left.value
-        self.GLOBAL_SCOPE[var_name] = self.visit(node.right)
+        val = self.GLOBAL_SCOPE[var_name] = self.visit(node.right)
+        return val
 
     def visit_NoOp(self, node):
         pass
@@ -307,8 +333,8 @@ class Interpreter(NodeVisitor):
 
     def visit_Var(self, node):
         var_name = node.value
-        val = self.GLOBAL_SCOPE.get(var_name)
-        if val is None:
+        val = self.GLOBAL_SCOPE.get(var_name, UNSET)
+        if val is UNSET:
             raise NameError(repr(var_name))
         else:
             return val
@@ -329,16 +355,158 @@ class Interpreter(NodeVisitor):
         elif isinstance(node, NoOp):
             return self.visit_NoOp(node)
 
+    def check(self, tree):
+        """检查未定义的变量，返回符号表；parser 在解析时已经做过符号检查（有 symtab）的，直接用它的符号表"""
+        symtab = getattr(self.parser, 'symtab', None)
+        if symtab is not None:
+            return symtab
+        symbol_builder = SymbolTableBuilder(self.trace)
+        symbol_builder.visit(tree)
+        return symbol_builder.symtab
+
     def interpret(self):
         tree = self.parser.parse()
-        symbol_builder = SymbolTableBuilder()
-        symbol_builder.visit(tree)
-        return self.visit(tree)
+        self.check(tree)
+        for optimize in self.passes:
+            tree = optimize(tree)
+        self.tree = tree
+        self.values = None
+        self.graph = None
+        if not self.track_updates or not isinstance(tree, Compound):
+            return self.visit(tree)
+        values = []
+        for child in tree.children:
+            if isinstance(child, Assign):
+                values.append(self.visit(child))
+            else:
+                self.visit(child)
+        self.values = values
+
+    def update(self, changes):
+        """
+        像电子表格一样更新输入：changes 是 {变量名: 新值}，把这些变量的第一次赋值（输入）改成新值，
+        只按依赖图重算受影响的语句，返回最终值发生变化的变量并写回 GLOBAL_SCOPE。
+        结果与把源码中这条赋值改成新值之后重新执行相同；后面再给这个变量赋值的语句照常按依赖重算。
+        依赖图按 interpret() 执行的（优化之后的）语法树建立；CSE 会让后面的语句改读保存结果的变量，
+        所以用了 DataflowOptimizer 时不要把这些变量当作输入。
+        没有开启 track_updates 时，第一次 update() 建立依赖图要把整个程序重新算一遍。
+        """
+        if self.tree is None:
+            raise Exception('nothing to update, call interpret() first')
+        if self.graph is None:
+            from spi_depgraph import DependencyGraph
+            self.graph = DependencyGraph(self.tree, self.values)
+        changed = self.graph.update(changes)
+        self.store(changed)
+        return changed
+
+    def interpret_lazy(self, names):
+        """
+        按需求值：只计算 names 中的变量（取每个变量的最后一次赋值）传递依赖的赋值语句，
+        每条语句最多算一次，返回 {变量名: 值} 并写入 GLOBAL_SCOPE。与这些变量无关的语句不执行，
+        其中的运行时错误（比如除数为 0）也不会出现。
+        """
+        from spi_depgraph import DependencyGraph
+        tree = self.parser.parse()
+        self.check(tree)
+        for optimize in self.passes:
+            tree = optimize(tree)
+        self.tree = tree
+        self.graph = DependencyGraph(tree)
+        indexes = []
+        for var_name in names:
+            index = self.graph.last_def.get(var_name)
+            if index is None:
+                raise NameError(repr(var_name))
+            indexes.append(index)
+        memo = self.graph.demand(indexes)
+        result = {var_name: memo[index] for var_name, index in zip(names, indexes)}
+        self.store(result)
+        return result
+
+    def store(self, bindings):
+        """write {name: value} computed outside visit() into GLOBAL_SCOPE"""
+        self.GLOBAL_SCOPE.update(bindings)
+
+    def interpret_stream(self):
+        """
+        边解析边执行：每条语句做完符号检查就立即执行，不保留整棵语法树。
+        注意未定义变量、语法错误要执行到对应语句时才会报出。
+        """
+        symbol_builder = None if getattr(self.parser, 'symtab', None) is not None else SymbolTableBuilder(self.trace)
+        for node in self.parser.iter_statements():
+            if symbol_builder is not None:
+                symbol_builder.visit(node)
+            self.visit(node)
+
+
+class SlotInterpreter(Interpreter):
+    """
+    变量按符号检查时分配的槽位号存取：运行在预先分配好的 list 上，不再按名字查 dict。
+    GLOBAL_SCOPE 在读取时才由槽位生成。
+    """
+    def __init__(self, parser, passes=(), track_updates=False):
+        self.slot_names = []
+        self.slot_of = {}
+        self.slots = []
+        super().__init__(parser, passes, track_updates)
+
+    @property
+    def GLOBAL_SCOPE(self):
+        return {name: val for name, val in zip(self.slot_names, self.slots) if val is not UNSET}
+
+    @GLOBAL_SCOPE.setter
+    def GLOBAL_SCOPE(self, scope):
+        self.slots = [UNSET] * len(self.slot_names)
+        for var_name, val in scope.items():
+            if var_name not in self.slot_of:
+                raise NameError(repr(var_name))
+            self.slots[self.slot_of[var_name]] = val
+
+    def check(self, tree):
+        symtab = super().check(tree)
+        self.slot_names = symtab.slot_names()
+        self.slot_of = {name: slot for slot, name in enumerate(self.slot_names)}
+        self.slots = [UNSET] * len(self.slot_names)
+        return symtab
+
+    def store(self, bindings):
+        for var_name, val in bindings.items():
+            self.slots[self.slot_of[var_name]] = val
+
+    def interpret_stream(self):
+        """边解析边执行：每条语句做完符号检查后，为新定义的变量追加槽位再执行"""
+        symtab = getattr(self.parser, 'symtab', None)
+        symbol_builder = None if symtab is not None else SymbolTableBuilder(self.trace)
+        if symbol_builder is not None:
+            symtab = symbol_builder.symtab
+        self.slot_names = []
+        self.slot_of = {}
+        self.slots = []
+        for node in self.parser.iter_statements():
+            if symbol_builder is not None:
+                symbol_builder.visit(node)
+            if len(symtab) > len(self.slot_names):
+                for var_name in symtab.slot_names(len(self.slot_names)):
+                    self.slot_of[var_name] = len(self.slot_names)
+                    self.slot_names.append(var_name)
+                    self.slots.append(UNSET)
+            self.visit(node)
+
+    def visit_Assign(self, node):
+        val = self.slots[node.left.slot] = self.visit(node.right)
+        return val
+
+    def visit_Var(self, node):
+        val = self.slots[node.slot]
+        if val is UNSET:
+            raise NameError(repr(node.value))
+        return val
 
 
 class SymbolTableBuilder(NodeVisitor):
-    def __init__(self):
-        self.symtab = SymbolTable()
+    def __init__(self, trace=print):
+        self.symtab = SymbolTable(trace)
 
     def visit_BinOp(self, node):
         self.visit(node.left)
@@ -369,6 +537,7 @@ class SymbolTableBuilder(NodeVisitor):
         var_name = node.left.value
         var_symbol = VarSymbol(var_name, None)
         self.symtab.define(var_symbol)
+        node.left.slot = var_symbol.slot
         self.visit(node.right)
 
     def visit_Var(self, node):
@@ -376,6 +545,7 @@ class SymbolTableBuilder(NodeVisitor):
         var_symbol = self.symtab.lookup(var_name)
         if var_symbol is None:
             raise NameError(repr(var_name))
+        node.slot = var_symbol.slot
 
     def visit(self, node):
         if isinstance(node, BinOp):
@@ -396,14 +566,66 @@ class SymbolTableBuilder(NodeVisitor):
 
 
 def main():
-    import sys
-    py_file = sys.argv[1]
+    import argparse
+    from spi_lexer import LEXERS
+    argparser = argparse.ArgumentParser(description='Simple python interpreter.')
+    argparser.add_argument('py_file', help='python source file')
+    argparser.add_argument('--lexer', choices=sorted(LEXERS), default='analyzer',
+                           help='lexical analyzer backend (default: analyzer)')
+    argparser.add_argument('--stream', action='store_true',
+                           help='read the source in chunks and execute statements as they are parsed')
+    argparser.add_argument('--fused', action='store_true',
+                           help='check symbols while parsing instead of in a separate pass, without tracing')
+    argparser.add_argument('--cache', action='store_true',
+                           help='keep the compiled bytecode in __spicache__ next to the script and reuse it '
+                                'while the script is unchanged')
+    argparser.add_argument('--profile', action='store_true',
+                           help='print time per phase and per node type, and tokens/s, to stderr')
+    argparser.add_argument('--profile-json', metavar='FILE', help='write the profile as JSON to FILE')
+    argparser.add_argument('--flamegraph', metavar='FILE',
+                           help='write the profile as collapsed stacks (flamegraph.pl / speedscope) to FILE')
+    args = argparser.parse_args()
+    if args.fused:
+        from spi_parser import CheckingParser as parser_class
+    else:
+        parser_class = Parser
+    py_file = args.py_file
     # py_file = 'assignments.txt'
+    if args.stream:
+        from spi_lexer import StreamAnalyzer
+        with open(py_file, 'rb') as source:
+            interpreter = Interpreter(parser_class(StreamAnalyzer(source)))
+            interpreter.interpret_stream()
+        print(interpreter.GLOBAL_SCOPE)
+        return
     text = open(py_file, 'r').read()
     print(f"begin parse input: {text}")
-    lexer = Analyzer(text)
-    parser = Parser(lexer)
+    if args.cache:
+        from spi_cache import CACHE_DIR, DiskCache
+        from spi_bytecode import run
+        disk_cache = DiskCache(os.path.join(os.path.dirname(os.path.abspath(py_file)), CACHE_DIR))
+        scope = {}
+        run(disk_cache.get(text), scope)
+        print(scope)
+        return
+    lexer = LEXERS[args.lexer](text)
+    parser = parser_class(lexer)
     interpreter = Interpreter(parser)
+    if args.profile or args.profile_json or args.flamegraph:
+        import sys
+        from spi_profile import Profiler
+        profiler = Profiler()
+        profiler.profile(interpreter)
+        print(interpreter.GLOBAL_SCOPE)
+        if args.profile:
+            print(profiler.report(), file=sys.stderr)
+        if args.profile_json:
+            with open(args.profile_json, 'w') as out:
+                out.write(profiler.to_json(indent=2))
+        if args.flamegraph:
+            with open(args.flamegraph, 'w') as out:
+                out.write(profiler.collapsed())
+        return
     result = interpreter.interpret()
     print(interpreter.GLOBAL_SCOPE)
 
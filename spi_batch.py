@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@file: spi_batch.py
+@author: amazing coder
+@date: 2026/10/18
+@desc: 批量执行脚本文件：把文件分块交给多个进程执行，结果按完成的先后顺序输出成 JSON lines
+eg: python spi_batch.py scripts/ other.txt --workers 8
+{"file": "scripts/a.txt", "ok": true, "scope": {"a": 1, "b": 2}}
+{"file": "scripts/bad.txt", "ok": false, "error": "NameError: 'c'"}
+"""
+
+import argparse
+import fnmatch
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+
+from spi_cache import COMPILERS, CachedInterpreter
+
+
+def evaluate_source(text, kind='bytecode'):
+    """run text and return its GLOBAL_SCOPE; the front end goes through the process-wide PROGRAM_CACHE"""
+    interpreter = CachedInterpreter(text, kind)
+    interpreter.interpret()
+    return interpreter.GLOBAL_SCOPE
+
+
+def run_file(path, kind='bytecode'):
+    """run one script file, return its result record; errors are reported in the record instead of raised"""
+    try:
+        with open(path, 'r') as source:
+            text = source.read()
+        return {'file': path, 'ok': True, 'scope': evaluate_source(text, kind)}
+    except Exception as e:
+        return {'file': path, 'ok': False, 'error': '{}: {}'.format(type(e).__name__, e)}
+
+
+def json_value(val):
+    """JSON 没有 inf / nan，这些值写成字符串 'inf'、'-inf'、'nan'（结果里只有数字，不会与字符串混淆）"""
+    if isinstance(val, float) and not math.isfinite(val):
+        return repr(val)
+    return val
+
+
+def encode_record(record):
+    """
+    (ok, line)：一条结果记录写成一行严格的 JSON。
+    写不出来的结果（比如超过 4300 位的整数，str() 和 JSON 都会拒绝）换成一条错误记录，保留 file / id 等字段
+    """
+    if 'scope' in record:
+        record = dict(record, scope={var_name: json_value(val) for var_name, val in record['scope'].items()})
+    try:
+        return record['ok'], json.dumps(record, allow_nan=False)
+    except ValueError as e:
+        failed = {key: val for key, val in record.items() if key not in ('ok', 'scope', 'error')}
+        failed.update(ok=False, error='{}: {}'.format(type(e).__name__, e))
+        return False, json.dumps(failed)
+
+
+def dumps_record(record):
+    """one result record as a line of strict JSON"""
+    return encode_record(record)[1]
+
+
+def run_chunk(paths, kind='bytecode'):
+    # 一个任务处理一批文件，减少进程间传递任务和结果的次数
+    return [run_file(path, kind) for path in paths]
+
+
+def iter_files(paths, pattern='*.txt'):
+    """yield the given files, and the files matching pattern under the given directories (recursively, sorted)"""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for directory, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in sorted(fnmatch.filter(filenames, pattern)):
+                yield os.path.join(directory, filename)
+
+
+def iter_chunks(paths, chunksize):
+    chunk = []
+    for path in paths:
+        chunk.append(path)
+        if len(chunk) == chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_files(paths, workers=None, chunksize=16, kind='bytecode', window=None):
+    """
+    run the files on a process pool, yield the result records in completion order.
+    最多 window 个任务（默认每个工作进程两个）同时提交，前面的结果取走之后才继续读 paths，
+    内存占用与输入文件的数目无关。
+    """
+    if window is None:
+        window = 2 * (workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for chunk in iter_chunks(paths, chunksize):
+            if len(pending) >= window:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+            pending.add(executor.submit(run_chunk, chunk, kind))
+        for future in as_completed(pending):
+            yield from future.result()
+
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(description='Run many script files in parallel, print JSON lines.')
+    argparser.add_argument('paths', nargs='+', help='script files or directories')
+    argparser.add_argument('--pattern', default='*.txt', help='file name pattern inside directories (default: *.txt)')
+    argparser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    argparser.add_argument('--chunksize', type=int, default=16, help='files per task (default: 16)')
+    argparser.add_argument('--kind', choices=sorted(COMPILERS), default='bytecode',
+                           help='compiled form to execute (default: bytecode)')
+    args = argparser.parse_args(argv)
+    if args.chunksize < 1:
+        argparser.error('--chunksize must be >= 1')
+    if args.workers is not None and args.workers < 1:
+        argparser.error('--workers must be >= 1')
+
+    start = time.perf_counter()
+    count = failed = 0
+    for record in run_files(iter_files(args.paths, args.pattern), args.workers, args.chunksize, args.kind):
+        ok, line = encode_record(record)
+        sys.stdout.write(line + '\n')
+        count += 1
+        failed += not ok
+    sys.stdout.flush()
+    print('{} files, {} failed, {:.3f}s'.format(count, failed, time.perf_counter() - start), file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
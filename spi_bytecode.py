@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@file: spi_bytecode.py
+@author: amazing coder
+@date: 2026/10/18
+@desc: 字节码编译器和栈式虚拟机
+每条指令占两格 (opcode, arg)，整个程序是一个 array('I')，常量和变量名分别放在 consts / names 里
+eg: c = a + 2
+LOAD_NAME   0 (a)
+LOAD_CONST  0 (2)
+BINARY_ADD
+STORE_NAME  1 (c)
+"""
+
+import marshal
+from array import array
+
+from abs_syntax_tree import BinOp, Num, UnaryOp, Var, Compound, Assign
+from interpreter import PLUS, MINUS, MUL, DIV, UNSET, Interpreter
+
+
+LOAD_CONST, LOAD_NAME, STORE_NAME, BINARY_ADD, BINARY_SUB, BINARY_MUL, BINARY_DIV, UNARY_NEG = range(8)
+OPNAMES = ('LOAD_CONST', 'LOAD_NAME', 'STORE_NAME', 'BINARY_ADD', 'BINARY_SUB', 'BINARY_MUL', 'BINARY_DIV',
+           'UNARY_NEG')
+BINARY_OPCODES = {PLUS: BINARY_ADD, MINUS: BINARY_SUB, MUL: BINARY_MUL, DIV: BINARY_DIV}
+
+# 序列化格式版本，字节码布局变化时加一
+BYTECODE_VERSION = 1
+BYTECODE_MAGIC = b'SPIB'
+
+
+class CodeObject(object):
+    def __init__(self, code=None, consts=None, names=None):
+        self.code = array('I') if code is None else code
+        self.consts = [] if consts is None else consts
+        self.names = [] if names is None else names
+
+    def __eq__(self, other):
+        return (isinstance(other, CodeObject) and self.code == other.code
+                and self.names == other.names
+                and [(type(c), c) for c in self.consts] == [(type(c), c) for c in other.consts])
+
+    def disassemble(self):
+        lines = []
+        for pc in range(0, len(self.code), 2):
+            opcode, arg = self.code[pc], self.code[pc + 1]
+            if opcode == LOAD_CONST:
+                lines.append('{:<12}{} ({!r})'.format(OPNAMES[opcode], arg, self.consts[arg]))
+            elif opcode in (LOAD_NAME, STORE_NAME):
+                lines.append('{:<12}{} ({})'.format(OPNAMES[opcode], arg, self.names[arg]))
+            else:
+                lines.append(OPNAMES[opcode])
+        return lines
+
+
+class BytecodeCompiler(object):
+    """把 Compound/Assign/表达式编译成 CodeObject；按后序迭代遍历，不受递归深度限制"""
+    def __init__(self):
+        self.code_object = CodeObject()
+        self._const_index = {}
+        self._name_index = {}
+
+    def const(self, value):
+        # 1 和 1.0 是不同的常量
+        key = (type(value), value)
+        index = self._const_index.get(key)
+        if index is None:
+            index = self._const_index[key] = len(self.code_object.consts)
+            self.code_object.consts.append(value)
+        return index
+
+    def name(self, var_name):
+        index = self._name_index.get(var_name)
+        if index is None:
+            index = self._name_index[var_name] = len(self.code_object.names)
+            self.code_object.names.append(var_name)
+        return index
+
+    def compile(self, tree):
+        emit = self.code_object.code.extend
+        stack = [(tree, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if isinstance(node, Num):
+                emit((LOAD_CONST, self.const(node.value)))
+            elif isinstance(node, Var):
+                emit((LOAD_NAME, self.name(node.value)))
+            elif expanded:
+                if isinstance(node, BinOp):
+                    emit((BINARY_OPCODES[node.token.type], 0))
+                elif isinstance(node, UnaryOp):
+                    if node.token.type == MINUS:
+                        emit((UNARY_NEG, 0))
+                else:
+                    emit((STORE_NAME, self.name(node.left.value)))
+            elif isinstance(node, BinOp):
+                stack.append((node, True))
+                stack.append((node.right, False))
+                stack.append((node.left, False))
+            elif isinstance(node, UnaryOp):
+                stack.append((node, True))
+                stack.append((node.expr, False))
+            elif isinstance(node, Assign):
+                stack.append((node, True))
+                stack.append((node.right, False))
+            elif isinstance(node, Compound):
+                stack.extend((child, False) for child in reversed(node.children))
+        return self.code_object
+
+
+def run(code_object, scope):
+    """执行字节码，结果写入 scope；没有跳转指令，所以直接顺序迭代 (opcode, arg)"""
+    consts = code_object.consts
+    names = code_object.names
+    stack = []
+    push = stack.append
+    pop = stack.pop
+    instructions = iter(code_object.code)
+    for opcode, arg in zip(instructions, instructions):
+        if opcode == LOAD_NAME:
+            var_name = names[arg]
+            val = scope.get(var_name, UNSET)
+            if val is UNSET:
+                raise NameError(repr(var_name))
+            push(val)
+        elif opcode == LOAD_CONST:
+            push(consts[arg])
+        elif opcode == BINARY_ADD:
+            right = pop()
+            stack[-1] = stack[-1] + right
+        elif opcode == BINARY_SUB:
+            right = pop()
+            stack[-1] = stack[-1] - right
+        elif opcode == BINARY_MUL:
+            right = pop()
+            stack[-1] = stack[-1] * right
+        elif opcode == BINARY_DIV:
+            right = pop()
+            stack[-1] = stack[-1] / right
+        elif opcode == UNARY_NEG:
+            stack[-1] = -stack[-1]
+        elif opcode == STORE_NAME:
+            scope[names[arg]] = pop()
+
+
+def dumps(code_object):
+    """serialize a CodeObject to bytes"""
+    return BYTECODE_MAGIC + marshal.dumps((BYTECODE_VERSION, code_object.code.tobytes(),
+                                           code_object.consts, code_object.names))
+
+
+def loads(data):
+    """load a CodeObject written by dumps, ValueError if the data is not valid bytecode"""
+    if data[:len(BYTECODE_MAGIC)] != BYTECODE_MAGIC:
+        raise ValueError('bad bytecode magic')
+    try:
+        version, raw_code, consts, names = marshal.loads(data[len(BYTECODE_MAGIC):])
+    except (EOFError, TypeError, ValueError):
+        raise ValueError('bad bytecode data') from None
+    if version != BYTECODE_VERSION:
+        raise ValueError('bytecode version {} is not supported'.format(version))
+    code = array('I')
+    try:
+        code.frombytes(raw_code)
+        code_object = CodeObject(code, list(consts), list(names))
+    except (TypeError, ValueError):
+        raise ValueError('bad bytecode data') from None
+    verify(code_object)
+    return code_object
+
+
+def verify(code_object):
+    """
+    检查字节码能在 run() 中安全执行，否则抛出 ValueError：opcode 合法、常量和变量名下标不越界、
+    常量是数字、变量名是字符串、栈不会弹空，每条赋值语句执行完栈都是空的
+    """
+    code = code_object.code
+    if len(code) % 2:
+        raise ValueError('bad bytecode instructions')
+    if not all(type(const) in (int, float) for const in code_object.consts):
+        raise ValueError('bad bytecode constants')
+    if not all(type(name) is str for name in code_object.names):
+        raise ValueError('bad bytecode names')
+    const_count = len(code_object.consts)
+    name_count = len(code_object.names)
+    depth = 0
+    instructions = iter(code)
+    for opcode, arg in zip(instructions, instructions):
+        if opcode == LOAD_NAME or opcode == LOAD_CONST:
+            if arg >= (name_count if opcode == LOAD_NAME else const_count):
+                raise ValueError('bytecode operand out of range')
+            depth += 1
+        elif opcode == STORE_NAME:
+            if arg >= name_count or depth != 1:
+                raise ValueError('bad bytecode instructions')
+            depth = 0
+        elif opcode == UNARY_NEG:
+            if depth < 1:
+                raise ValueError('bytecode stack underflow')
+        elif opcode <= BINARY_DIV:
+            if depth < 2:
+                raise ValueError('bytecode stack underflow')
+            depth -= 1
+        else:
+            raise ValueError('bad bytecode instructions')
+    if depth:
+        raise ValueError('bad bytecode instructions')
+
+
+class VMInterpreter(Interpreter):
+    """与 Interpreter 相同的接口：解析、符号检查之后编译成字节码，在虚拟机上执行"""
+    def __init__(self, parser):
+        super().__init__(parser)
+        self.code_object = None
+
+    def interpret(self):
+        tree = self.parser.parse()
+        self.check(tree)
+        self.code_object = BytecodeCompiler().compile(tree)
+        return run(self.code_object, self.GLOBAL_SCOPE)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@file: spi_cache.py
+@author: amazing coder
+@date: 2026/10/18
+@desc: 进程内的程序缓存：源码哈希 -> 已经解析并做过符号检查的语法树 / 字节码 / 闭包
+反复提交的热点程序直接取缓存，跳过词法分析、语法分析和符号检查；超过容量时淘汰最久没用过的 (LRU)
+DiskCache 与 __pycache__ 类似，把字节码保存在缓存目录里，源码没变时再次运行不用重新解析
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from interpreter import Interpreter
+from spi_lexer import RegexAnalyzer
+from spi_parser import CheckingPrattParser
+from spi_bytecode import BYTECODE_VERSION, BytecodeCompiler, run, dumps, loads
+from spi_closure import ClosureCompiler
+
+
+def parse_checked(text):
+    """parse text and check its symbols in the same pass"""
+    return CheckingPrattParser(RegexAnalyzer(text)).parse()
+
+
+def compile_bytecode(text):
+    return BytecodeCompiler().compile(parse_checked(text))
+
+
+def compile_closure(text):
+    return ClosureCompiler().compile(parse_checked(text))
+
+
+# 缓存的三种形式；语法树给 Interpreter 遍历，不要再对它执行会原地修改语法树的优化 pass
+COMPILERS = {
+    'tree': parse_checked,
+    'bytecode': compile_bytecode,
+    'closure': compile_closure,
+}
+
+
+def source_key(text):
+    return hashlib.sha256(text.encode('utf-8')).digest()
+
+
+class ProgramCache(object):
+    """
+    (源码哈希, 形式) -> 编译结果，最多保存 maxsize 项，maxsize 为 0 时不缓存。
+    hits / misses / evictions 是命中、未命中、淘汰的次数。可以在多个线程中共用；
+    编译在锁外进行，同一个程序同时未命中时可能各编译一次，结果相同。
+    解析或符号检查出错的程序不会被缓存，每次都重新抛出异常。
+    """
+    def __init__(self, maxsize=128):
+        if maxsize < 0:
+            raise ValueError('maxsize must be >= 0')
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, text, kind='bytecode'):
+        """return the cached program for text, compiling it on a miss"""
+        if kind not in COMPILERS:
+            raise ValueError('unknown program kind {!r}'.format(kind))
+        key = (source_key(text), kind)
+        with self._lock:
+            program = self._entries.get(key)
+            if program is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return program
+            self.misses += 1
+        program = COMPILERS[kind](text)
+        with self._lock:
+            if self.maxsize:
+                self._entries[key] = program
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return program
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'size': len(self._entries), 'maxsize': self.maxsize, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions}
+
+
+PROGRAM_CACHE = ProgramCache()
+
+CACHE_DIR = '__spicache__'
+# 缓存文件头：magic + 格式版本 + 源码的 sha256，后面是 spi_bytecode.dumps 的结果
+CACHE_MAGIC = b'SPIC'
+CACHE_VERSION = 1
+HEADER_SIZE = len(CACHE_MAGIC) + 2 + 32
+
+
+class DiskCache(object):
+    """
+    字节码的磁盘缓存，文件名由源码的 sha256 和格式版本组成，加载时再校验一遍文件头和字节码，
+    任何一项不对（文件损坏、被截断、版本变化）都当作未命中，重新编译并覆盖。
+    写入先写临时文件再 os.replace，其他进程不会读到写了一半的文件。
+    """
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, digest):
+        return os.path.join(self.directory, '{}.{}-{}.spic'.format(digest.hex(), CACHE_VERSION, BYTECODE_VERSION))
+
+    def load(self, digest):
+        """return the cached CodeObject for the source digest, None if there is no valid entry"""
+        try:
+            with open(self.path(digest), 'rb') as cache_file:
+                data = cache_file.read()
+        except OSError:
+            return None
+        if (data[:len(CACHE_MAGIC)] != CACHE_MAGIC
+                or int.from_bytes(data[len(CACHE_MAGIC):len(CACHE_MAGIC) + 2], 'little') != CACHE_VERSION
+                or data[len(CACHE_MAGIC) + 2:HEADER_SIZE] != digest):
+            return None
+        try:
+            return loads(data[HEADER_SIZE:])
+        except ValueError:
+            return None
+
+    def store(self, digest, code_object):
+        data = CACHE_MAGIC + CACHE_VERSION.to_bytes(2, 'little') + digest + dumps(code_object)
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, self.path(digest))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def get(self, text):
+        """return the bytecode for text, from the cache directory when the source is unchanged"""
+        digest = source_key(text)
+        code_object = self.load(digest)
+        if code_object is not None:
+            self.hits += 1
+            return code_object
+        self.misses += 1
+        code_object = compile_bytecode(text)
+        try:
+            self.store(digest, code_object)
+        except OSError:
+            # 缓存目录不可写时照常运行，只是下次还要重新编译
+            pass
+        return code_object
+
+
+class CachedInterpreter(Interpreter):
+    """与 Interpreter 相同的接口，源码的前端处理结果从 ProgramCache 中取，默认用模块级的 PROGRAM_CACHE"""
+    def __init__(self, text, kind='bytecode', cache=None):
+        super().__init__(None)
+        self.text = text
+        self.kind = kind
+        self.cache = PROGRAM_CACHE if cache is None else cache
+
+    def interpret(self):
+        program = self.cache.get(self.text, self.kind)
+        if self.kind == 'tree':
+            return self.visit(program)
+        if self.kind == 'bytecode':
+            return run(program, self.GLOBAL_SCOPE)
+        return program(self.GLOBAL_SCOPE)
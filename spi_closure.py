@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@file: spi_closure.py
+@author: amazing coder
+@date: 2026/10/18
+@desc: 把 AST 一次性编译成嵌套的 python 闭包，执行时不再按节点类型分派
+eg: a = b + 2  ==>  assign(scope): scope['a'] = operator.add(var_b(scope), 2)
+"""
+
+import gc
+import operator
+import time
+
+from abs_syntax_tree import Num, NoOp
+from interpreter import PLUS, MINUS, MUL, DIV, NodeVisitor, Interpreter
+
+
+OPERATORS = {
+    PLUS: operator.add,
+    MINUS: operator.sub,
+    MUL: operator.mul,
+    DIV: operator.truediv,
+}
+
+
+class ClosureCompiler(NodeVisitor):
+    """每个 visit_xxx 返回一个 fn(scope) 闭包，运算符在编译时就确定"""
+    def visit_BinOp(self, node):
+        op = OPERATORS[node.token.type]
+        # 常量操作数直接放进闭包，少一次调用
+        if isinstance(node.right, Num):
+            left, right = self.visit(node.left), node.right.value
+            return lambda scope: op(left(scope), right)
+        if isinstance(node.left, Num):
+            left, right = node.left.value, self.visit(node.right)
+            return lambda scope: op(left, right(scope))
+        left, right = self.visit(node.left), self.visit(node.right)
+        return lambda scope: op(left(scope), right(scope))
+
+    def visit_Num(self, node):
+        value = node.value
+        return lambda scope: value
+
+    def visit_UnaryOp(self, node):
+        expr = self.visit(node.expr)
+        if node.token.type == PLUS:
+            return expr
+        return lambda scope: -expr(scope)
+
+    def visit_Var(self, node):
+        var_name = node.value
+
+        def var(scope):
+            try:
+                return scope[var_name]
+            except KeyError:
+                raise NameError(repr(var_name)) from None
+        return var
+
+    def visit_Assign(self, node):
+        var_name = node.left.value
+        right = self.visit(node.right)
+
+        def assign(scope):
+            scope[var_name] = right(scope)
+        return assign
+
+    def visit_NoOp(self, node):
+        return lambda scope: None
+
+    def visit_Compound(self, node):
+        statements = tuple(self.visit(child) for child in node.children if not isinstance(child, NoOp))
+
+        def compound(scope):
+            for statement in statements:
+                statement(scope)
+        return compound
+
+    def compile(self, tree):
+        # 编译只创建新的闭包，不会产生循环引用；暂停分代 GC，免得它在编译大程序时反复扫描整棵语法树
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self.visit(tree)
+        finally:
+            if enabled:
+                gc.enable()
+
+
+class ClosureInterpreter(Interpreter):
+    """与 Interpreter 相同的接口和 GLOBAL_SCOPE / NameError 语义，执行的是编译好的闭包"""
+    def __init__(self, parser):
+        super().__init__(parser)
+        self.program = None
+
+    def interpret(self):
+        tree = self.parser.parse()
+        self.check(tree)
+        self.program = ClosureCompiler().compile(tree)
+        return self.program(self.GLOBAL_SCOPE)
+
+    def rerun(self):
+        """run the compiled program again on a fresh GLOBAL_SCOPE"""
+        self.GLOBAL_SCOPE = {}
+        return self.program(self.GLOBAL_SCOPE)
+
+
+def benchmark(tree, runs=20):
+    """evaluate an already checked tree `runs` times with the tree walker and with closures"""
+    results = {}
+    start = time.perf_counter()
+    for _ in range(runs):
+        Interpreter(None).visit(tree)
+    results['tree-walker'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    program = ClosureCompiler().compile(tree)
+    for _ in range(runs):
+        program({})
+    results['closure'] = time.perf_counter() - start
+    return results
+
+
+if __name__ == '__main__':
+    from interpreter import Parser
+    from spi_lexer import RegexAnalyzer
+    source = 'v0 = 1\n' + '\n'.join('v{0} = {0} * (v{1} + 3) - v{1} / 4 + -v{1}'.format(i, i - 1)
+                                    for i in range(1, 5000))
+    for kind, seconds in benchmark(Parser(RegexAnalyzer(source)).parse()).items():
+        print('{:<12} {:.3f}s'.format(kind, seconds))
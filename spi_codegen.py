@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@file: spi_codegen.py
+@author: amazing coder
+@date: 2026/10/18
+@desc: native 后端：我们的语言是 python 的子集，把 abs_syntax_tree 翻译成标准库 ast，
+compile() 成 CPython 代码对象后 exec，算术运算直接由 CPython 的解释循环完成
+"""
+
+import ast
+
+from interpreter import PLUS, MINUS, MUL, DIV, NodeVisitor, Interpreter
+
+
+BINARY_OPERATORS = {PLUS: ast.Add, MINUS: ast.Sub, MUL: ast.Mult, DIV: ast.Div}
+UNARY_OPERATORS = {PLUS: ast.UAdd, MINUS: ast.USub}
+
+
+class PyAstTranslator(NodeVisitor):
+    """abs_syntax_tree -> ast.Module"""
+    def visit_BinOp(self, node):
+        return ast.BinOp(left=self.visit(node.left), op=BINARY_OPERATORS[node.token.type](),
+                         right=self.visit(node.right))
+
+    def visit_Num(self, node):
+        return ast.Constant(value=node.value)
+
+    def visit_UnaryOp(self, node):
+        return ast.UnaryOp(op=UNARY_OPERATORS[node.token.type](), operand=self.visit(node.expr))
+
+    def visit_Var(self, node):
+        return ast.Name(id=node.value, ctx=ast.Load())
+
+    def visit_Assign(self, node):
+        return ast.Assign(targets=[ast.Name(id=node.left.value, ctx=ast.Store())], value=self.visit(node.right))
+
+    def visit_NoOp(self, node):
+        return None
+
+    def visit_Compound(self, node):
+        body = [statement for statement in (self.visit(child) for child in node.children) if statement is not None]
+        return ast.fix_missing_locations(ast.Module(body=body, type_ignores=[]))
+
+
+def compile_tree(tree, filename='<spi>'):
+    """compile a checked program into a CPython code object"""
+    return compile(PyAstTranslator().visit(tree), filename, 'exec')
+
+
+def to_python_source(tree):
+    return ast.unparse(PyAstTranslator().visit(tree))
+
+
+def run(code, scope):
+    """exec the code object; assignments land in scope, builtins are not visible to the program"""
+    try:
+        exec(code, {'__builtins__': {}}, scope)
+    except NameError as e:
+        # 与 Interpreter.visit_Var 抛出的异常保持一致
+        raise NameError(repr(e.name)) from None
+
+
+class NativeInterpreter(Interpreter):
+    """与 Interpreter 相同的接口，仍然先用 SymbolTableBuilder 检查未定义变量，再交给 CPython 执行"""
+    def __init__(self, parser):
+        super().__init__(parser)
+        self.code = None
+
+    def interpret(self):
+        tree = self.parser.parse()
+        self.check(tree)
+        self.code = compile_tree(tree)
+        return run(self.code, self.GLOBAL_SCOPE)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@file: spi_depgraph.py
+@author: amazing coder
+@date: 2026/10/18
+@desc: 赋值语句之间的依赖图，用于输入变化后的增量重算
+每条赋值语句是图中的一个节点，它读到的每个变量连到该变量在它之前最近的一次赋值 (reaching definition)。
+程序是没有跳转的直线代码，依赖总是从前面的语句指向后面的语句，所以语句下标本身就是拓扑序。
+eg:
+0  e = 45
+1  f = e * 2        reads e <- 0
+2  e = f + 1        reads f <- 1
+3  g = e - f        reads e <- 2, f <- 1
+e 改变时只需要重算 1、2、3；如果 f 重算后的值没变，2、3 也不用再算
+"""
+
+import heapq
+import math
+
+from abs_syntax_tree import Assign, BinOp, UnaryOp, Var
+from interpreter import UNSET, Interpreter
+
+
+def same_value(old, new):
+    """值完全相同才不需要继续传播：1 和 1.0 不算相同，0.0 和 -0.0 也不算"""
+    if type(old) is not type(new) or old != new:
+        return False
+    return not isinstance(new, float) or math.copysign(1.0, old) == math.copysign(1.0, new)
+
+
+class DependencyGraph(object):
+    """
+    statements : Compound 中的赋值语句（NoOp 不参与）
+    sources    : 每条语句读的 (变量名, 提供这个值的语句下标)
+    dependents : 每条语句的值被哪些语句读到
+    defs       : 变量名 -> 给它赋值的所有语句下标
+    values     : 每条语句最近一次算出的值；可以直接传入 Interpreter.interpret() 记下的值，否则第一次 update()
+                 时 evaluate() 整个程序
+    pinned     : update() 指定的输入，语句下标 -> 值；变量的第一次赋值是它的输入，这条语句不再重算
+    memo       : demand() 按需算过的语句，下标 -> 值
+    """
+    def __init__(self, tree, values=None):
+        self.statements = [child for child in tree.children if isinstance(child, Assign)]
+        self.sources = []
+        self.dependents = [[] for _ in self.statements]
+        self.defs = {}
+        last_def = {}
+        dependents = self.dependents
+        # 建图与 interpret() 一样要走遍整个程序，这里直接按节点类型展开，不经过 read_names 的生成器
+        for index, statement in enumerate(self.statements):
+            names = set()
+            stack = [statement.right]
+            while stack:
+                node = stack.pop()
+                node_type = type(node)
+                if node_type is BinOp:
+                    stack.append(node.right)
+                    stack.append(node.left)
+                elif node_type is Var:
+                    names.add(node.value)
+                elif node_type is UnaryOp:
+                    stack.append(node.expr)
+            sources = []
+            for var_name in names:
+                source = last_def.get(var_name)
+                sources.append((var_name, source))
+                if source is not None:
+                    dependents[source].append(index)
+            self.sources.append(sources)
+            var_name = statement.left.value
+            self.defs.setdefault(var_name, []).append(index)
+            last_def[var_name] = index
+        self.last_def = last_def
+        self.values = None if values is None else list(values)
+        if self.values is not None and len(self.values) != len(self.statements):
+            raise ValueError('expected {} statement values, got {}'.format(len(self.statements), len(self.values)))
+        self.pinned = {}
+        self.memo = {}
+        self._evaluator = Interpreter(None)
+
+    def compute(self, index, values):
+        """evaluate the right side of statement index, reading each variable from its reaching definition"""
+        scope = {}
+        for var_name, source in self.sources[index]:
+            if source is not None:
+                scope[var_name] = values(source)
+        self._evaluator.GLOBAL_SCOPE = scope
+        return self._evaluator.visit(self.statements[index].right)
+
+    def evaluate(self):
+        """compute every statement once in program order"""
+        self.values = []
+        get = self.values.__getitem__
+        for index in range(len(self.statements)):
+            pinned = self.pinned.get(index, UNSET)
+            self.values.append(self.compute(index, get) if pinned is UNSET else pinned)
+
+    def demand(self, indexes):
+        """
+        compute only the given statements and the statements they transitively read (iterative, memoized in
+        self.memo); return the memo
+        """
+        memo = self.memo
+        stack = list(indexes)
+        while stack:
+            index = stack[-1]
+            if index in memo:
+                stack.pop()
+                continue
+            missing = [source for _, source in self.sources[index] if source is not None and source not in memo]
+            if missing:
+                stack.extend(missing)
+                continue
+            stack.pop()
+            pinned = self.pinned.get(index, UNSET)
+            memo[index] = self.compute(index, memo.__getitem__) if pinned is UNSET else pinned
+        return memo
+
+    def update(self, changes):
+        """
+        把 changes 里每个变量的第一次赋值固定成新值，只重算受影响的语句，返回最终值变化了的变量 {name: value}。
+        重算出错时（比如除数变成 0）抛出异常，图和之前的值都保持不变。
+        """
+        if self.values is None:
+            self.evaluate()
+        values = self.values
+        pinned = dict(self.pinned)
+        # 本次更新算出的新值，全部成功之后才写回 values
+        pending = {}
+        queue = []
+        queued = set()
+
+        def changed(index, value):
+            if same_value(values[index], value):
+                return
+            pending[index] = value
+            for dependent in self.dependents[index]:
+                if dependent not in queued:
+                    queued.add(dependent)
+                    heapq.heappush(queue, dependent)
+
+        for var_name, value in changes.items():
+            indexes = self.defs.get(var_name)
+            if indexes is None:
+                raise NameError(repr(var_name))
+            pinned[indexes[0]] = value
+            changed(indexes[0], value)
+
+        def current(index):
+            return pending.get(index, values[index])
+
+        while queue:
+            index = heapq.heappop(queue)
+            if index in pinned:
+                continue
+            changed(index, self.compute(index, current))
+
+        self.pinned = pinned
+        result = {}
+        for index, value in pending.items():
+            values[index] = value
+            var_name = self.statements[index].left.value
+            if self.last_def[var_name] == index:
+                result[var_name] = value
+        return result
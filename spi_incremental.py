@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@file: spi_incremental.py
+@author: amazing coder
+@date: 2026/10/18
+@desc: 编辑源码后增量重新解析：只重新分析编辑位置所在的语句，再把新的 Assign 节点拼回原来的 Compound.children
+每条语句记录它在源码中的起止偏移。一次编辑 (offset, removed, inserted) 影响的区间向两边各多取一条语句，
+因为编辑可能让相邻语句的 token 粘在一起（比如删掉 "a=x b=1" 中的空格），也可能拆出新的语句。
+区间内的文本单独解析，必须恰好解析完，并且最后一个 token 在完整文本中也恰好在区间末尾结束；
+否则退回到解析整个文本，语法错误与 Parser.parse 完全相同。
+编辑位置之后的语句偏移都要加上长度变化量，这一步是延迟做的：只记录"从第 k 条语句开始还差 shift"，
+下一次编辑时只修正两次编辑位置之间的语句，连续在附近编辑时代价与文件大小无关。
+"""
+
+import bisect
+from array import array
+
+from abs_syntax_tree import Compound, NoOp
+from interpreter import EOF, ID
+from spi_lexer import TOKEN_PATTERN, SpanAnalyzer
+from spi_parser import PrattParser
+
+
+def parse_spans(text, pos=0, endpos=None, parser_class=PrattParser):
+    """parse text[pos:endpos] as a sequence of statements; return (statements, starts, ends) with absolute offsets"""
+    analyzer = SpanAnalyzer(text, pos, endpos)
+    parser = parser_class(analyzer)
+    statements = []
+    starts = array('q')
+    ends = array('q')
+    while parser.current_token.type == ID:
+        starts.append(analyzer.last_start)
+        statements.append(parser.assignment_statement())
+        # 语句解析完时 current_token 已经是下一个 token，语句结束在它前一个 token 的末尾
+        ends.append(analyzer.prev_end)
+    if parser.current_token.type != EOF:
+        parser.error()
+    return statements, starts, ends
+
+
+def crosses(text, pos, boundary):
+    """lexing the whole text from the token start pos, does some token span across boundary"""
+    match = TOKEN_PATTERN.match
+    while pos < boundary:
+        token = match(text, pos)
+        if token is None or token.start(token.lastindex) >= boundary:
+            return False
+        pos = token.end()
+    return pos > boundary
+
+
+class Document(object):
+    """
+    一份源码和它的语法树。tree 与 Parser.parse(text) 的结果相同，edit() 之后也是同一个 Compound 对象。
+    编辑后的文本有语法错误时 edit() 抛出与 Parser.parse 相同的异常，text 已经更新，valid 为 False，
+    tree 保持上一次成功解析的结果。reparsed 是最近一次重新分析的字符数。
+    starts / ends 是每条语句的起止偏移，下标不小于 shift_from 的还要加上 shift，用 span(i) 取实际偏移。
+    """
+    def __init__(self, text, parser_class=PrattParser):
+        self.parser_class = parser_class
+        self.tree = Compound()
+        self.reparsed = 0
+        self._reset(text)
+
+    def _reset(self, text):
+        # 文本有语法错误时照样接受这次编辑（编辑器里输入到一半是常态），异常抛给调用者，下一次编辑再整体解析
+        self.text = text
+        self.valid = False
+        self.reparsed = len(text)
+        statements, self.starts, self.ends = parse_spans(text, parser_class=self.parser_class)
+        self.shift_from = len(self.starts)
+        self.shift = 0
+        self.tree.children[:] = statements or [NoOp()]
+        self.valid = True
+
+    def span(self, index):
+        """(start, end) offsets of statement index in text"""
+        shift = self.shift if index >= self.shift_from else 0
+        return self.starts[index] + shift, self.ends[index] + shift
+
+    def _bisect(self, bisect_function, offsets, offset):
+        """bisect over the actual offsets: the part before shift_from as stored, the rest shifted"""
+        split = self.shift_from
+        if split < len(offsets) and (split == 0 or offsets[split - 1] < offset):
+            return bisect_function(offsets, offset - self.shift, split)
+        return bisect_function(offsets, offset, 0, split)
+
+    def _move_shift(self, index):
+        """move shift_from to index, applying or un-applying the pending shift to the statements in between"""
+        split = self.shift_from
+        if self.shift and index != split:
+            low, high, shift = (split, index, self.shift) if index > split else (index, split, -self.shift)
+            self.starts[low:high] = array('q', [pos + shift for pos in self.starts[low:high]])
+            self.ends[low:high] = array('q', [pos + shift for pos in self.ends[low:high]])
+        self.shift_from = index
+
+    def edit(self, offset, removed, inserted):
+        """replace text[offset:offset + removed] with inserted, update and return the tree"""
+        old_text = self.text
+        if offset < 0 or removed < 0 or offset + removed > len(old_text):
+            raise ValueError('edit out of range')
+        text = old_text[:offset] + inserted + old_text[offset + removed:]
+        delta = len(inserted) - removed
+        count = len(self.starts)
+        if not count or not self.valid:
+            self._reset(text)
+            return self.tree
+
+        # 与编辑区间相交或相接的语句，再向两边各扩一条
+        first = self._bisect(bisect.bisect_left, self.ends, offset)
+        last = self._bisect(bisect.bisect_right, self.starts, offset + removed) - 1
+        low = max(first - 1, 0)
+        high = min(last + 1, count - 1)
+        start = 0 if low == 0 else self.span(low)[0]
+        end = len(old_text) if high == count - 1 else self.span(high)[1]
+        end += delta
+        try:
+            statements, starts, ends = parse_spans(text, start, end, self.parser_class)
+        except Exception:
+            # 区间单独解析失败不一定是整个文本有错，交给下面的整体解析判断
+            statements = None
+        if statements is not None and end < len(text):
+            # 区间末尾的 token 在完整文本中不能和后面的字符粘成一个 token
+            if statements:
+                token_start = starts[-1]
+            else:
+                token_start = self.span(low - 1)[0] if low else 0
+            if crosses(text, token_start, end):
+                statements = None
+        if statements is None:
+            self._reset(text)
+            return self.tree
+
+        self.reparsed = end - start
+        self.text = text
+        # 区间之后的语句还差 shift + delta；先让 shift_from 正好落在区间之后，再替换区间
+        self._move_shift(high + 1)
+        self.tree.children[low:high + 1] = statements
+        self.starts[low:high + 1] = starts
+        self.ends[low:high + 1] = ends
+        self.shift_from = low + len(statements)
+        self.shift += delta
+        if not self.tree.children:
+            self.tree.children.append(NoOp())
+        return self.tree
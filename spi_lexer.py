@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@file: spi_lexer.py
+@author: amazing coder
+@date: 2026/10/18
+@desc: 其他词法分析器实现，与 interpreter.Analyzer 输出相同的 token 流
+RegexAnalyzer : 用一个预编译的总正则一次识别一个 token，替代逐字符的 advance()
+SpanAnalyzer : 只分析文本的一段，记录每个 token 的偏移，用于增量重新解析
+StreamAnalyzer : 从文件对象 / mmap 分块读取源码，可以处理任意大的脚本
+TokenBuffer : 一次性把整个输入切成紧凑的 token 列（共享 Token 的下标 / 偏移），可以缓存后反复解析
+"""
+
+import codecs
+import re
+import time
+from array import array
+
+from spi_token import Token
+from interpreter import (INTEGER, FLOAT, PLUS, EOF, MINUS, MUL, DIV, LPAREN, RPAREN, ID, ASSIGN, REPL,
+                         PYTHON_RESERVED_KEYWORDS, Analyzer)
+
+
+# token 前面的空白直接在同一次 match 里跳过；ERROR 只匹配非空白字符，
+# 这样 \s* 回溯时不会把空白当成非法字符
+TOKEN_PATTERN = re.compile(r"""
+    \s*
+    (?:
+        (?P<OP>[-+*/()=])
+      | (?P<ID>[^\W\d_][^\W_]*)
+      | (?P<FLOAT>\d+\.\d*)
+      | (?P<INTEGER>\d+)
+      | (?P<REPL>\\n)
+      | (?P<ERROR>\S)
+    )
+""", re.VERBOSE)
+
+_OP, _ID, _FLOAT, _INTEGER, _REPL, _ERROR = (TOKEN_PATTERN.groupindex[name] for name in (
+    'OP', 'ID', 'FLOAT', 'INTEGER', 'REPL', 'ERROR'))
+
+CHUNK_SIZE = 1 << 16
+
+# TokenBuffer 中的类型码就是 token 类型在 TOKEN_TYPES 中的下标
+TOKEN_TYPES = (INTEGER, FLOAT, PLUS, MINUS, MUL, DIV, LPAREN, RPAREN, ID, ASSIGN, REPL, EOF)
+TYPE_CODES = {token_type: code for code, token_type in enumerate(TOKEN_TYPES)}
+
+OPERATORS = {
+    '+': PLUS,
+    '-': MINUS,
+    '*': MUL,
+    '/': DIV,
+    '(': LPAREN,
+    ')': RPAREN,
+    '=': ASSIGN,
+}
+
+
+class RegexAnalyzer(object):
+    """Lexical analyzer 基于总正则的词法分析器，接口与 Analyzer 相同"""
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+        self._match = TOKEN_PATTERN.match
+
+    def error(self):
+        raise SyntaxError("invalid syntax")
+
+    def get_next_token(self):
+        """recognize one token (and the whitespace before it) with a single regex match."""
+        match = self._match(self.text, self.pos)
+        if match is None:
+            # 只剩空白
+            self.pos = len(self.text)
+            return Token(EOF, None)
+        self.pos = match.end()
+        return token_from_match(match)
+
+
+class SpanAnalyzer(RegexAnalyzer):
+    """
+    RegexAnalyzer 只分析 text[pos:endpos]，并记录 token 在 text 中的位置：
+    last_start / last_end 是刚返回的 token 的起止偏移，prev_end 是它前一个 token 的结束偏移
+    """
+    def __init__(self, text, pos=0, endpos=None):
+        super().__init__(text)
+        self.pos = pos
+        self.endpos = len(text) if endpos is None else endpos
+        self.last_start = self.last_end = self.prev_end = pos
+
+    def get_next_token(self):
+        self.prev_end = self.last_end
+        match = self._match(self.text, self.pos, self.endpos)
+        if match is None:
+            self.pos = self.last_start = self.last_end = self.endpos
+            return Token(EOF, None)
+        self.pos = self.last_end = match.end()
+        self.last_start = match.start(match.lastindex)
+        return token_from_match(match)
+
+
+class StreamAnalyzer(object):
+    """
+    Lexical analyzer 流式词法分析器，从文件对象或 mmap 中按固定大小分块读取源码，
+    内存占用只与块大小有关，与源码大小无关。
+    source 只需要提供 read(size)，返回 str 或 bytes（bytes 按 encoding 增量解码）
+    """
+    def __init__(self, source, chunk_size=CHUNK_SIZE, encoding='utf-8'):
+        self.source = source
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self._match = TOKEN_PATTERN.match
+
+    def error(self):
+        raise SyntaxError("invalid syntax")
+
+    def fill(self):
+        """drop the consumed part of the buffer and append the next chunk."""
+        data = self.source.read(self.chunk_size)
+        if isinstance(data, bytes):
+            self.eof = not data
+            data = self.decoder.decode(data, final=self.eof)
+        else:
+            self.eof = not data
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+
+    def get_next_token(self):
+        while True:
+            match = self._match(self.buffer, self.pos)
+            if match is None:
+                # 缓冲区剩下的都是空白
+                self.pos = len(self.buffer)
+            elif match.end() < len(self.buffer) or self.eof:
+                break
+            if self.eof:
+                return Token(EOF, None)
+            # token 可能跨越块边界（比如 "12" | "3.5"、"\\" | "n"），读入下一块后重新匹配
+            self.fill()
+        self.pos = match.end()
+        return token_from_match(match)
+
+
+def token_from_match(match):
+    """build the Token for a TOKEN_PATTERN match"""
+    # 分组序号与 TOKEN_PATTERN 中的顺序一致，用序号分派比按组名比较快
+    kind = match.lastindex
+    value = match.group(kind)
+    if kind == _OP:
+        return Token(OPERATORS[value], value)
+    if kind == _ID:
+        if value in PYTHON_RESERVED_KEYWORDS:
+            raise SyntaxError("invalid syntax")
+        return Token(ID, value)
+    if kind == _INTEGER:
+        return Token(INTEGER, int(value))
+    if kind == _FLOAT:
+        return Token(FLOAT, float(value))
+    if kind == _REPL:
+        return Token(REPL, '\\n')
+    raise SyntaxError("invalid syntax")
+
+
+class TokenBuffer(object):
+    """
+    紧凑的 token 流：ids 是 array('I') 下标，offsets 是 token 在源码中的起始位置，types 是按需生成的 array('B') 类型码。
+    同一个词素（同一个变量名、运算符、同样写法的数字）只创建一个 Token，放在 tokens 里，ids 指向它，
+    所以解析时不再为每个 token 分配对象，变量名字符串也是共享的。最后一个 token 总是 EOF。
+    通过 reader() 交给 Parser 消费，同一个 buffer 可以反复解析；Token 只读，AST 节点可以共享。
+    """
+    def __init__(self):
+        self.ids = array('I')
+        self.offsets = array('Q')
+        self.tokens = []
+
+    @classmethod
+    def tokenize(cls, text):
+        """lex the whole text in one pass"""
+        buffer = cls()
+        tokens = buffer.tokens
+        append_id = buffer.ids.append
+        append_offset = buffer.offsets.append
+        # 不同种类的 token 的词素不会相同，直接用词素文本做 key
+        token_ids = {}
+        get_id = token_ids.get
+        for match in TOKEN_PATTERN.finditer(text):
+            kind = match.lastindex
+            lexeme = match.group(kind)
+            token_id = get_id(lexeme)
+            if token_id is None:
+                token = token_from_match(match)
+                token_id = token_ids[lexeme] = len(tokens)
+                tokens.append(token)
+            append_id(token_id)
+            append_offset(match.start(kind))
+        append_id(len(tokens))
+        append_offset(len(text))
+        tokens.append(Token(EOF, None))
+        return buffer
+
+    @property
+    def types(self):
+        type_codes = [TYPE_CODES[token.type] for token in self.tokens]
+        return array('B', map(type_codes.__getitem__, self.ids))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        return self.tokens[self.ids[index]]
+
+    def reader(self, index=0):
+        return TokenReader(self, index)
+
+
+class TokenReader(object):
+    """按下标读取 TokenBuffer，接口与 Analyzer 相同，可以直接传给 Parser；读到 EOF 之后一直返回 EOF"""
+    def __init__(self, buffer, index=0):
+        self.buffer = buffer
+        self.index = index
+        self._tokens = buffer.tokens
+        self._ids = buffer.ids
+        self._last = len(buffer) - 1
+
+    def get_next_token(self):
+        index = self.index
+        if index < self._last:
+            self.index = index + 1
+        return self._tokens[self._ids[index]]
+
+
+def buffer_reader(text):
+    return TokenBuffer.tokenize(text).reader()
+
+
+LEXERS = {
+    'analyzer': Analyzer,
+    'regex': RegexAnalyzer,
+    'buffer': buffer_reader,
+}
+
+
+def make_lexer(text, kind='regex'):
+    return LEXERS[kind](text)
+
+
+def benchmark(text, repeat=3):
+    """tokenize text with every lexer in LEXERS, return the best time of each"""
+    results = {}
+    for kind, lexer_class in LEXERS.items():
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            lexer = lexer_class(text)
+            token = lexer.get_next_token()
+            while token.type != EOF:
+                token = lexer.get_next_token()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[kind] = best
+    return results
+
+
+if __name__ == '__main__':
+    source = '\n'.join('v{0} = {0} * (v{1} + 3.25) - 17 / 4'.format(i, i - 1) for i in range(1, 20000))
+    for kind, seconds in benchmark('v0 = 1\n' + source).items():
+        print('{:<10} {:.3f}s'.format(kind, seconds))
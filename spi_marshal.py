@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@file: spi_marshal.py
+@author: amazing coder
+@date: 2026/10/18
+@desc: abs_syntax_tree 的紧凑二进制格式，可以在进程之间传递或者保存解析好的程序
+格式：MAGIC + 版本 + varint(pools 长度) + marshal(常量池, 变量名池) + varint(节点数) + 节点流
+节点按后序排列，每个节点是一个 kind 字节加上若干 varint：
+  NUM / VAR        : 常量池 / 变量名池下标
+  UNARY_*          : 子节点引用
+  BINOP_*          : 左、右子节点引用
+  ASSIGN           : 变量名池下标、右边的引用
+  NOOP             : 无
+  COMPOUND         : 子节点个数、每个子节点的引用
+运算符直接编码在 kind 里。子节点引用是相对距离（当前节点下标 - 子节点下标），通常一个字节就够；
+同一个节点对象只写一次，HashConsParser 生成的 DAG 加载之后仍然共享节点。
+Var 的槽位号不保存，加载后的语法树与 Parser.parse 的结果一样，需要的话再做符号检查。
+"""
+
+import gc
+import marshal
+import time
+
+from abs_syntax_tree import BinOp, Num, UnaryOp, Var, NoOp, Compound, Assign
+from spi_token import Token
+from interpreter import INTEGER, FLOAT, PLUS, MINUS, MUL, DIV, ID, ASSIGN
+
+AST_MAGIC = b'SPIA'
+# 格式版本，节点编码变化时加一
+AST_VERSION = 1
+
+NUM, VAR, UNARY_PLUS, UNARY_MINUS, BINOP_PLUS, BINOP_MINUS, BINOP_MUL, BINOP_DIV, ASSIGN_STMT, NOOP, COMPOUND = \
+    range(11)
+UNARY_KINDS = {PLUS: UNARY_PLUS, MINUS: UNARY_MINUS}
+BINOP_KINDS = {PLUS: BINOP_PLUS, MINUS: BINOP_MINUS, MUL: BINOP_MUL, DIV: BINOP_DIV}
+# kind -> 加载时共用的运算符 token
+OP_TOKENS = {
+    UNARY_PLUS: Token(PLUS, '+'),
+    UNARY_MINUS: Token(MINUS, '-'),
+    BINOP_PLUS: Token(PLUS, '+'),
+    BINOP_MINUS: Token(MINUS, '-'),
+    BINOP_MUL: Token(MUL, '*'),
+    BINOP_DIV: Token(DIV, '/'),
+}
+ASSIGN_TOKEN = Token(ASSIGN, '=')
+
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, pos, value):
+    """continue decoding a varint whose first byte (>= 0x80) was already read; return (value, pos)"""
+    value &= 0x7f
+    shift = 7
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class _Pool(object):
+    def __init__(self):
+        self.items = []
+        self.index = {}
+
+    def add(self, value):
+        # 1 和 1.0 是不同的常量
+        key = (type(value), value)
+        index = self.index.get(key)
+        if index is None:
+            index = self.index[key] = len(self.items)
+            self.items.append(value)
+        return index
+
+
+def dump(tree):
+    """serialize an abs_syntax_tree (or DAG) to bytes"""
+    consts = _Pool()
+    names = _Pool()
+    stream = bytearray()
+    emit = stream.append
+    # id(node) -> 节点下标；共享的节点只写一次
+    index_of = {}
+    count = 0
+    stack = [(tree, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if id(node) in index_of:
+            continue
+        if not expanded:
+            stack.append((node, True))
+            if isinstance(node, BinOp):
+                stack.append((node.right, False))
+                stack.append((node.left, False))
+            elif isinstance(node, UnaryOp):
+                stack.append((node.expr, False))
+            elif isinstance(node, Assign):
+                stack.append((node.right, False))
+            elif isinstance(node, Compound):
+                stack.extend((child, False) for child in reversed(node.children))
+            continue
+        if isinstance(node, BinOp):
+            emit(BINOP_KINDS[node.token.type])
+            write_varint(stream, count - index_of[id(node.left)])
+            write_varint(stream, count - index_of[id(node.right)])
+        elif isinstance(node, Num):
+            emit(NUM)
+            write_varint(stream, consts.add(node.value))
+        elif isinstance(node, Var):
+            emit(VAR)
+            write_varint(stream, names.add(node.value))
+        elif isinstance(node, UnaryOp):
+            emit(UNARY_KINDS[node.token.type])
+            write_varint(stream, count - index_of[id(node.expr)])
+        elif isinstance(node, Assign):
+            emit(ASSIGN_STMT)
+            write_varint(stream, names.add(node.left.value))
+            write_varint(stream, count - index_of[id(node.right)])
+        elif isinstance(node, Compound):
+            emit(COMPOUND)
+            write_varint(stream, len(node.children))
+            for child in node.children:
+                write_varint(stream, count - index_of[id(child)])
+        else:
+            emit(NOOP)
+        index_of[id(node)] = count
+        count += 1
+
+    pools = marshal.dumps((consts.items, names.items))
+    header = bytearray(AST_MAGIC)
+    header.append(AST_VERSION)
+    write_varint(header, len(pools))
+    header += pools
+    write_varint(header, count)
+    return bytes(header + stream)
+
+
+def load(data):
+    """rebuild the tree written by dump, ValueError if the data is not a valid dump"""
+    if data[:len(AST_MAGIC)] != AST_MAGIC:
+        raise ValueError('bad AST magic')
+    # 加载只创建新节点，不会产生循环引用；与 ClosureCompiler.compile 一样暂停分代 GC
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _load(data)
+    except (IndexError, KeyError, EOFError, TypeError):
+        raise ValueError('bad AST data') from None
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _load(data):
+    pos = len(AST_MAGIC)
+    if data[pos] != AST_VERSION:
+        raise ValueError('AST version {} is not supported'.format(data[pos]))
+    pos += 1
+    size = data[pos]
+    pos += 1
+    if size >= 0x80:
+        size, pos = read_varint(data, pos, size)
+    consts, names = marshal.loads(data[pos:pos + size])
+    pos += size
+    count = data[pos]
+    pos += 1
+    if count >= 0x80:
+        count, pos = read_varint(data, pos, count)
+    if not count:
+        raise ValueError('empty AST')
+
+    # 常量和变量名的 token 预先建好，同一个常量 / 变量名的节点共用
+    num_tokens = [Token(FLOAT if isinstance(value, float) else INTEGER, value) for value in consts]
+    var_tokens = [Token(ID, name) for name in names]
+    op_tokens = OP_TOKENS
+    nodes = []
+    append = nodes.append
+    for index in range(count):
+        kind = data[pos]
+        pos += 1
+        if kind >= BINOP_PLUS and kind <= BINOP_DIV:
+            left = data[pos]
+            pos += 1
+            if left >= 0x80:
+                left, pos = read_varint(data, pos, left)
+            right = data[pos]
+            pos += 1
+            if right >= 0x80:
+                right, pos = read_varint(data, pos, right)
+            if left > index or right > index:
+                raise ValueError('bad AST reference')
+            append(BinOp(left=nodes[index - left], op=op_tokens[kind], right=nodes[index - right]))
+        elif kind == NUM or kind == VAR:
+            arg = data[pos]
+            pos += 1
+            if arg >= 0x80:
+                arg, pos = read_varint(data, pos, arg)
+            append(Num(num_tokens[arg]) if kind == NUM else Var(var_tokens[arg]))
+        elif kind == UNARY_MINUS or kind == UNARY_PLUS:
+            expr = data[pos]
+            pos += 1
+            if expr >= 0x80:
+                expr, pos = read_varint(data, pos, expr)
+            if expr > index:
+                raise ValueError('bad AST reference')
+            append(UnaryOp(op=op_tokens[kind], expr=nodes[index - expr]))
+        elif kind == ASSIGN_STMT:
+            arg = data[pos]
+            pos += 1
+            if arg >= 0x80:
+                arg, pos = read_varint(data, pos, arg)
+            right = data[pos]
+            pos += 1
+            if right >= 0x80:
+                right, pos = read_varint(data, pos, right)
+            if right > index:
+                raise ValueError('bad AST reference')
+            append(Assign(left=Var(var_tokens[arg]), op=ASSIGN_TOKEN, right=nodes[index - right]))
+        elif kind == COMPOUND:
+            size = data[pos]
+            pos += 1
+            if size >= 0x80:
+                size, pos = read_varint(data, pos, size)
+            compound = Compound()
+            children = compound.children
+            for _ in range(size):
+                child = data[pos]
+                pos += 1
+                if child >= 0x80:
+                    child, pos = read_varint(data, pos, child)
+                if child > index:
+                    raise ValueError('bad AST reference')
+                children.append(nodes[index - child])
+            append(compound)
+        elif kind == NOOP:
+            append(NoOp())
+        else:
+            raise ValueError('bad AST node kind {}'.format(kind))
+    if pos != len(data):
+        raise ValueError('trailing data after AST')
+    return nodes[-1]
+
+
+def benchmark(text, repeat=3):
+    """best time of parsing text versus loading its dump"""
+    from interpreter import Parser
+    from spi_lexer import RegexAnalyzer
+    results = {'source_bytes': len(text.encode('utf-8'))}
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tree = Parser(RegexAnalyzer(text)).parse()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    results['parse'] = best
+    data = dump(tree)
+    results['dump_bytes'] = len(data)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        load(data)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    results['load'] = best
+    return results
+
+
+if __name__ == '__main__':
+    source = 'v0 = 1\n' + '\n'.join('v{0} = {0} * (v{1} + 3) - v{1} / 4 + -v{1}'.format(i % 300, (i - 1) % 300)
+                                    for i in range(1, 30000))
+    for key, value in benchmark(source).items():
+        print('{:<14} {}'.format(key, value))
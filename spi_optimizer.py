@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@file: spi_optimizer.py
+@author: amazing coder
+@date: 2026/10/18
+@desc: 语法分析和求值之间的优化 pass
+ConstantFolder : 常量折叠、合并一元 +/- 链、安全的代数化简
+DeadStoreEliminator : 删除 Compound 中被覆盖之前从没被读过的赋值
+CommonSubexpressionEliminator : 输入没有被重新赋值时，重复的表达式直接复用已经算好的变量
+"""
+
+import operator
+import time
+
+from abs_syntax_tree import BinOp, Num, UnaryOp, Var, Assign
+from spi_token import Token
+from interpreter import INTEGER, FLOAT, PLUS, MINUS, MUL, DIV, NodeVisitor
+
+
+OPERATORS = {
+    PLUS: operator.add,
+    MINUS: operator.sub,
+    MUL: operator.mul,
+    DIV: operator.truediv,
+}
+
+
+def make_num(value):
+    return Num(Token(FLOAT if isinstance(value, float) else INTEGER, value))
+
+
+def is_int_const(node, value):
+    """node is the INTEGER literal value (1.0 / 0.0 do not count: they would turn ints into floats)"""
+    return isinstance(node, Num) and node.token.type == INTEGER and node.value == value
+
+
+class ConstantFolder(NodeVisitor):
+    """
+    自底向上改写语法树，removed 记录删掉的节点数：
+    - 常量子树直接算出结果；算的时候出错的（除数为 0、很大的整数转 float 溢出）不折叠，留到运行时照常抛出
+    - +x => x，-(-x) => x，-常量 => 常量
+    - x*1 / 1*x / x-0 => x
+    x+0 不化简：-0.0 + 0 的结果是 0.0 而不是 -0.0；x/1 也不化简：整数除以 1 的结果是 float
+    """
+    def __init__(self):
+        self.removed = 0
+
+    def visit_BinOp(self, node):
+        left = node.left = self.visit(node.left)
+        right = node.right = self.visit(node.right)
+        op_type = node.token.type
+        if isinstance(left, Num) and isinstance(right, Num):
+            try:
+                value = OPERATORS[op_type](left.value, right.value)
+            except ArithmeticError:
+                return node
+            self.removed += 2
+            return make_num(value)
+        if op_type == MUL:
+            if is_int_const(right, 1):
+                self.removed += 2
+                return left
+            if is_int_const(left, 1):
+                self.removed += 2
+                return right
+        elif op_type == MINUS and is_int_const(right, 0):
+            self.removed += 2
+            return left
+        return node
+
+    def visit_Num(self, node):
+        return node
+
+    def visit_UnaryOp(self, node):
+        expr = node.expr = self.visit(node.expr)
+        if node.token.type == PLUS:
+            self.removed += 1
+            return expr
+        if isinstance(expr, Num):
+            self.removed += 1
+            return make_num(-expr.value)
+        if isinstance(expr, UnaryOp) and expr.token.type == MINUS:
+            self.removed += 2
+            return expr.expr
+        return node
+
+    def visit_Var(self, node):
+        return node
+
+    def visit_Assign(self, node):
+        node.right = self.visit(node.right)
+        return node
+
+    def visit_NoOp(self, node):
+        return node
+
+    def visit_Compound(self, node):
+        node.children = [self.visit(child) for child in node.children]
+        return node
+
+    def fold(self, tree):
+        return self.visit(tree)
+
+
+def iter_nodes(node):
+    """yield node and all its descendants (iterative)"""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        if isinstance(node, BinOp):
+            stack.append(node.right)
+            stack.append(node.left)
+        elif isinstance(node, UnaryOp):
+            stack.append(node.expr)
+
+
+def read_names(expr):
+    return {node.value for node in iter_nodes(expr) if isinstance(node, Var)}
+
+
+def may_raise(expr, types):
+    """
+    (raising, type)：expr 求值时是否可能抛异常，以及它的值的类型 INTEGER / FLOAT（不确定时为 None）。
+    types 是执行到这里时已经赋值过的变量 -> 类型。可能抛异常的情况：
+    - 读了之前从没赋值过的变量（NameError）
+    - 除法：除数可能是 0（ZeroDivisionError），大整数相除的结果也可能超出 float 的范围（OverflowError）
+    - int 和 float 混合运算：int 转成 float 时可能溢出（OverflowError）；类型不确定的也算
+    只有 int 与 int、float 与 float 之间的 + - * 和一元 +/- 一定不抛异常。
+    """
+    value_types = {}
+    stack = [(expr, False)]
+    while stack:
+        node, visited = stack.pop()
+        if isinstance(node, Num):
+            value_types[id(node)] = node.token.type
+        elif isinstance(node, Var):
+            if node.value not in types:
+                return True, None
+            value_types[id(node)] = types[node.value]
+        elif isinstance(node, UnaryOp):
+            if visited:
+                value_types[id(node)] = value_types[id(node.expr)]
+            else:
+                stack.append((node, True))
+                stack.append((node.expr, False))
+        elif isinstance(node, BinOp):
+            if not visited:
+                stack.append((node, True))
+                stack.append((node.right, False))
+                stack.append((node.left, False))
+                continue
+            left, right = value_types[id(node.left)], value_types[id(node.right)]
+            if node.token.type == DIV or left is None or left != right:
+                return True, None
+            value_types[id(node)] = left
+    return False, value_types[id(expr)]
+
+
+class DeadStoreEliminator(object):
+    """
+    逆序扫描 Compound.children 做活跃变量分析：x = ... 之后 x 在被读之前又被赋值，这条赋值就是死的。
+    每个变量的最后一次赋值会留在 GLOBAL_SCOPE 里，永远保留；可能抛异常的赋值也保留，错误行为不变。
+    GLOBAL_SCOPE 的内容不变，但变量第一次出现的顺序可能变化（它第一次被赋值的语句可能被删掉了）。
+    """
+    def __init__(self):
+        self.removed = 0
+
+    def eliminate(self, tree):
+        # 正向一遍：根据执行到每条赋值时哪些变量已经有值、各是什么类型，判断它会不会抛异常
+        types = {}
+        raises = []
+        for child in tree.children:
+            if isinstance(child, Assign):
+                raising, types[child.left.value] = may_raise(child.right, types)
+                raises.append(raising)
+            else:
+                raises.append(False)
+
+        live = set()
+        assigned_later = set()
+        kept = []
+        for child, raising in zip(reversed(tree.children), reversed(raises)):
+            if isinstance(child, Assign):
+                var_name = child.left.value
+                if var_name in assigned_later and var_name not in live and not raising:
+                    self.removed += 1
+                    continue
+                live.discard(var_name)
+                assigned_later.add(var_name)
+                live.update(read_names(child.right))
+            kept.append(child)
+        kept.reverse()
+        tree.children = kept
+        return tree
+
+
+class CommonSubexpressionEliminator(object):
+    """
+    正向扫描 Compound.children：c = a + b 之后，只要 a、b、c 都没有被重新赋值，
+    后面出现的 a + b 都换成 c。子表达式自底向上替换，c + c 这样替换后的结果也能继续复用。
+    表达式的结构用整数编号表示（相同结构编号相同），比较和哈希都是 O(1)。
+    语法树可能是共享节点的 DAG，所以不原地修改节点，子节点变化时生成新节点。
+    """
+    def __init__(self):
+        self.replaced = 0
+        self._key_ids = {}
+
+    def key_id(self, key):
+        key_id = self._key_ids.get(key)
+        if key_id is None:
+            key_id = self._key_ids[key] = len(self._key_ids)
+        return key_id
+
+    def rewrite(self, node, available):
+        """return (node, key id) with every available subexpression replaced by its holder variable"""
+        if isinstance(node, Num):
+            return node, self.key_id(('Num', node.token.type, node.value))
+        if isinstance(node, Var):
+            return node, self.key_id(('Var', node.value))
+        if isinstance(node, UnaryOp):
+            expr, expr_key = self.rewrite(node.expr, available)
+            if expr is not node.expr:
+                node = UnaryOp(op=node.token, expr=expr)
+            key = self.key_id(('UnaryOp', node.token.type, expr_key))
+        else:
+            left, left_key = self.rewrite(node.left, available)
+            right, right_key = self.rewrite(node.right, available)
+            if left is not node.left or right is not node.right:
+                node = BinOp(left=left, op=node.token, right=right)
+            key = self.key_id(('BinOp', node.token.type, left_key, right_key))
+        holder = available.get(key)
+        if holder is None:
+            return node, key
+        self.replaced += 1
+        # 直接复用赋值语句左边的 Var 节点，符号检查分配的槽位号也一起带过来
+        return holder, self.key_id(('Var', holder.value))
+
+    def eliminate(self, tree):
+        available = {}
+        # 变量名 -> 依赖它的可用表达式（它是输入或者保存结果的变量）
+        dependents = {}
+        children = []
+        for child in tree.children:
+            if isinstance(child, Assign):
+                right, key = self.rewrite(child.right, available)
+                if right is not child.right:
+                    child = Assign(left=child.left, op=child.token, right=right)
+                var_name = child.left.value
+                for stale in dependents.pop(var_name, ()):
+                    available.pop(stale, None)
+                if isinstance(right, (BinOp, UnaryOp)):
+                    inputs = read_names(right)
+                    if var_name not in inputs:
+                        available[key] = child.left
+                        for name in inputs | {var_name}:
+                            dependents.setdefault(name, set()).add(key)
+            children.append(child)
+        tree.children = children
+        return tree
+
+
+class DataflowOptimizer(object):
+    """
+    先做公共子表达式消除，再删除死赋值：CSE 只会增加对保存结果的变量的读，
+    之后的活跃变量分析看到的是替换后的读写，被复用的赋值不会被删掉。report() 返回两者的统计
+    """
+    def __init__(self):
+        self.dead_stores = DeadStoreEliminator()
+        self.cse = CommonSubexpressionEliminator()
+
+    def optimize(self, tree):
+        return self.dead_stores.eliminate(self.cse.eliminate(tree))
+
+    def report(self):
+        return {'dead_stores_removed': self.dead_stores.removed,
+                'subexpressions_reused': self.cse.replaced}
+
+
+def benchmark(text, runs=10):
+    """parse once, time the optimizer itself and `runs` evaluations with and without it"""
+    from interpreter import Parser, Interpreter
+    from spi_lexer import RegexAnalyzer
+    tree = Parser(RegexAnalyzer(text)).parse()
+    results = {'statements': len(tree.children)}
+    start = time.perf_counter()
+    for _ in range(runs):
+        Interpreter(None).visit(tree)
+    results['plain_eval'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    optimizer = DataflowOptimizer()
+    tree = optimizer.optimize(tree)
+    results['optimize'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        Interpreter(None).visit(tree)
+    results['optimized_eval'] = time.perf_counter() - start
+    results['optimized_statements'] = len(tree.children)
+    results.update(optimizer.report())
+    return results
+
+
+if __name__ == '__main__':
+    lines = ['a = 1', 'b = 2']
+    for i in range(20000):
+        lines.append('c = a * b + {}'.format(i))
+        lines.append('d{} = (a * b + {}) * 2 - (a * b + {})'.format(i % 50, i, i))
+        lines.append('t = d{} + c'.format(i % 50))
+        lines.append('b = b + 1')
+    for key, value in benchmark('\n'.join(lines)).items():
+        print('{:<22} {}'.format(key, value))
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@file: spi_parser.py
+@author: amazing coder
+@date: 2026/10/18
+@desc: 其他语法分析器实现，生成与 interpreter.Parser 相同的 AST
+PrattParser : 表达式部分用显式的运算符栈做优先级爬升，不再每一层优先级 / 每个括号递归一次
+HashConsParser : 结构相同的子表达式只保留一个节点，语法树变成 DAG
+CheckingParser : 解析的同时定义、查找符号，省掉单独的 SymbolTableBuilder 遍历
+"""
+
+import time
+
+from abs_syntax_tree import BinOp, Num, UnaryOp, Var, Assign
+from interpreter import INTEGER, FLOAT, PLUS, MINUS, MUL, DIV, LPAREN, RPAREN, ID, ASSIGN, Parser
+from spi_symbol import VarSymbol, SymbolTable
+from spi_lexer import TokenBuffer
+
+
+# 二元运算符优先级；一元运算符比所有二元运算符绑定得都紧，左括号只是分组标记
+BINARY_PRECEDENCE = {PLUS: 1, MINUS: 1, MUL: 2, DIV: 2}
+GROUP, UNARY = 0, 3
+PREFIX_TYPES = frozenset((PLUS, MINUS, LPAREN))
+
+
+class PrattParser(Parser):
+    """
+    expr 不再递归：操作数栈 + 运算符栈（precs/operators 两列：优先级和 token）。
+    生成的 BinOp/UnaryOp/Num/Var 树与 Parser.expr 完全相同，嵌套深度只受内存限制。
+    """
+    def expr(self):
+        get_next_token = self.analyzer.get_next_token
+        precedence = BINARY_PRECEDENCE
+        # 提供了 var_node(token) 的子类（比如做符号检查）用它构造 Var；自定义了 variable() 的子类仍然走 variable()
+        var_node = getattr(self, 'var_node', None)
+        variable = None if type(self).variable is Parser.variable or var_node is not None else self.variable
+        operands = []
+        precs = []
+        operators = []
+        depth = 0
+        token = self.current_token
+        while True:
+            # 操作数位置：先收集前缀的一元运算符和左括号
+            token_type = token.type
+            while token_type in PREFIX_TYPES:
+                precs.append(GROUP if token_type == LPAREN else UNARY)
+                operators.append(token)
+                if token_type == LPAREN:
+                    depth += 1
+                token = get_next_token()
+                token_type = token.type
+            if token_type == ID and variable is None:
+                node = Var(token) if var_node is None else var_node(token)
+                token = get_next_token()
+            elif token_type == INTEGER or token_type == FLOAT:
+                node = Num(token)
+                token = get_next_token()
+            elif token_type == ID:
+                self.current_token = token
+                node = variable()
+                token = self.current_token
+            else:
+                self.current_token = token
+                self.error()
+
+            # 操作数之后：一元运算符立即作用在操作数上，右括号把括号内的部分归约成一个操作数
+            while precs:
+                while precs and precs[-1] == UNARY:
+                    precs.pop()
+                    node = UnaryOp(op=operators.pop(), expr=node)
+                if token.type != RPAREN or not depth:
+                    break
+                while precs[-1] != GROUP:
+                    precs.pop()
+                    node = BinOp(left=operands.pop(), op=operators.pop(), right=node)
+                precs.pop()
+                operators.pop()
+                depth -= 1
+                token = get_next_token()
+
+            prec = precedence.get(token.type)
+            if prec is None:
+                break
+            # 左结合：栈顶优先级不低于当前运算符时先归约
+            while precs and precs[-1] >= prec:
+                precs.pop()
+                node = BinOp(left=operands.pop(), op=operators.pop(), right=node)
+            operands.append(node)
+            precs.append(prec)
+            operators.append(token)
+            token = get_next_token()
+
+        self.current_token = token
+        if depth:
+            self.error()
+        while operators:
+            node = BinOp(left=operands.pop(), op=operators.pop(), right=node)
+        return node
+
+
+class NodeInterner(object):
+    """
+    hash-consing：结构相同的 Num/Var/UnaryOp/BinOp 只保留一个实例。
+    子节点先规范化，所以父节点的 key 里直接用子节点的 id；nodes 持有所有规范节点，id 不会被复用。
+    """
+    def __init__(self):
+        self.nodes = {}
+        self.hits = 0
+
+    def intern(self, node):
+        """return the canonical node for node's structure (iterative, no recursion limit)"""
+        nodes = self.nodes
+        results = []
+        stack = [(node, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if isinstance(node, Num):
+                key = ('Num', node.token.type, node.value)
+            elif isinstance(node, Var):
+                key = ('Var', node.value)
+            elif not expanded:
+                stack.append((node, True))
+                if isinstance(node, BinOp):
+                    stack.append((node.right, False))
+                    stack.append((node.left, False))
+                else:
+                    stack.append((node.expr, False))
+                continue
+            elif isinstance(node, BinOp):
+                right = results.pop()
+                left = results.pop()
+                key = ('BinOp', node.token.type, id(left), id(right))
+                if key not in nodes:
+                    node.left = left
+                    node.right = right
+            else:
+                expr = results.pop()
+                key = ('UnaryOp', node.token.type, id(expr))
+                if key not in nodes:
+                    node.expr = expr
+            canonical = nodes.get(key)
+            if canonical is None:
+                canonical = nodes[key] = node
+            else:
+                self.hits += 1
+            results.append(canonical)
+        return results.pop()
+
+
+class HashConsMixin(object):
+    """每解析完一条赋值语句，就把它的两边换成规范节点，重复的子表达式立即被释放"""
+    def __init__(self, analyzer, interner=None):
+        self.interner = NodeInterner() if interner is None else interner
+        super().__init__(analyzer)
+
+    def assignment_statement(self):
+        node = super().assignment_statement()
+        node.left = self.interner.intern(node.left)
+        node.right = self.interner.intern(node.right)
+        return node
+
+
+class HashConsParser(HashConsMixin, Parser):
+    pass
+
+
+class HashConsPrattParser(HashConsMixin, PrattParser):
+    pass
+
+
+class SymbolCheckingMixin(object):
+    """
+    构造 Assign/Var 节点时就完成 SymbolTableBuilder 的工作：赋值先定义左边的变量（与 SymbolTableBuilder 一样，
+    在解析右边之前），读变量时查符号表，未定义的立即抛 NameError，并记下槽位号。
+    Interpreter.check 看到 parser 有 symtab 就不再遍历语法树。诊断输出默认关闭，trace 与 SymbolTable 相同。
+    """
+    def __init__(self, analyzer, symtab=None, trace=None):
+        self.symtab = SymbolTable(trace) if symtab is None else symtab
+        super().__init__(analyzer)
+
+    def var_node(self, token):
+        """build the Var node for a variable read and resolve it against the symbol table"""
+        node = Var(token)
+        var_symbol = self.symtab.lookup(node.value)
+        if var_symbol is None:
+            raise NameError(repr(node.value))
+        node.slot = var_symbol.slot
+        return node
+
+    def variable(self):
+        node = self.var_node(self.current_token)
+        self.eat(ID)
+        return node
+
+    def assignment_statement(self):
+        left = Var(self.current_token)
+        self.eat(ID)
+        var_symbol = self.symtab.define(VarSymbol(left.value, None))
+        left.slot = var_symbol.slot
+        token = self.current_token
+        self.eat(ASSIGN)
+        return Assign(left=left, op=token, right=self.expr())
+
+
+class CheckingParser(SymbolCheckingMixin, Parser):
+    pass
+
+
+class CheckingPrattParser(SymbolCheckingMixin, PrattParser):
+    pass
+
+
+PARSERS = {
+    'parser': Parser,
+    'pratt': PrattParser,
+    'hashcons': HashConsParser,
+    'hashcons-pratt': HashConsPrattParser,
+    'checking-pratt': CheckingPrattParser,
+}
+
+
+def benchmark(text, repeat=3):
+    """parse the same token stream with every parser in PARSERS, return the best time of each"""
+    buffer = TokenBuffer.tokenize(text)
+    results = {}
+    for kind, parser_class in PARSERS.items():
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            parser_class(buffer.reader()).parse()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[kind] = best
+    return results
+
+
+if __name__ == '__main__':
+    chain = 'a=1 b=' + '+'.join('a' if i % 3 else str(i) for i in range(200000))
+    for kind, seconds in benchmark(chain).items():
+        print('{:<10} {:.3f}s'.format(kind, seconds))
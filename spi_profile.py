@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@file: spi_profile.py
+@author: amazing coder
+@date: 2026/10/18
+@desc: 按需开启的性能剖析：各阶段耗时、每种节点的访问次数和耗时、每秒 token 数
+Interpreter 本身没有任何插桩，关闭时没有额外开销。profile() 只在这一次执行期间，
+把这个 interpreter 实例的 visit、它的词法分析器实例的 get_next_token 换成计时的版本，结束后恢复。
+eg:
+profiler = Profiler()
+profiler.profile(Interpreter(Parser(RegexAnalyzer(text))))
+profiler.as_dict()        # {'phases': {...}, 'tokens': ..., 'tokens_per_second': ..., 'nodes': {...}}
+profiler.collapsed()      # flamegraph.pl / speedscope 可以读取的折叠栈，单位微秒
+"""
+
+import json
+import time
+from contextlib import contextmanager
+
+# 语法分析时词法分析器是按需调用的，lex 是从 parse 中分出来的时间，parse 不含 lex
+PHASES = ('lex', 'parse', 'symbol', 'optimize', 'eval')
+
+
+class _Frame(object):
+    """调用树的一个节点：名字、自身耗时（不含子节点）、子节点 {名字: _Frame}"""
+    __slots__ = ('name', 'time', 'children')
+
+    def __init__(self, name):
+        self.name = name
+        self.time = 0.0
+        self.children = {}
+
+    def child(self, name):
+        frame = self.children.get(name)
+        if frame is None:
+            frame = self.children[name] = _Frame(name)
+        return frame
+
+
+class Profiler(object):
+    """
+    phases : 阶段 -> 秒
+    tokens : 词法分析器产生的 token 数（包括 EOF）
+    nodes  : 节点类型名 -> [访问次数, 累计耗时, 自身耗时]；累计耗时对递归的同类节点只算最外层一次，
+             与 cProfile 的 cumtime 一样
+    max_depth : 调用树记录的最大深度，更深的节点算在这一层上；长表达式链的语法树很深，
+             不限制的话折叠栈的输出与深度的平方成正比
+    计时本身有开销，节点耗时会偏大，适合比较不同节点、不同阶段之间的相对大小。
+    """
+    def __init__(self, max_depth=64):
+        self.max_depth = max_depth
+        self.phases = {}
+        self.tokens = 0
+        self.nodes = {}
+        self.root = _Frame('interpret')
+        self._frame = self.root
+
+    @contextmanager
+    def phase(self, name):
+        """time the with block as phase name, nested under the current frame"""
+        parent = self._frame
+        frame = self._frame = parent.child(name)
+        before = self._subtotal(frame)
+        start = time.perf_counter()
+        try:
+            yield frame
+        finally:
+            elapsed = time.perf_counter() - start
+            self._frame = parent
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed
+            frame.time += elapsed - (self._subtotal(frame) - before)
+
+    @staticmethod
+    def _subtotal(frame):
+        """total time recorded under frame's children"""
+        total = 0.0
+        stack = list(frame.children.values())
+        while stack:
+            child = stack.pop()
+            total += child.time
+            stack.extend(child.children.values())
+        return total
+
+    def instrument_lexer(self, analyzer, frame):
+        """count and time analyzer.get_next_token into frame; return a function that undoes it"""
+        inner = analyzer.get_next_token
+        clock = time.perf_counter
+        lex = frame.child('lex')
+        state = [0, 0.0]
+
+        def get_next_token():
+            start = clock()
+            token = inner()
+            state[1] += clock() - start
+            state[0] += 1
+            return token
+
+        analyzer.get_next_token = get_next_token
+
+        def restore():
+            del analyzer.get_next_token
+            self.tokens += state[0]
+            self.phases['lex'] = self.phases.get('lex', 0.0) + state[1]
+            lex.time += state[1]
+        return restore
+
+    def instrument_visitor(self, visitor, frame):
+        """time every visitor.visit call per node type, nested under frame; return a function that undoes it"""
+        inner = visitor.visit
+        clock = time.perf_counter
+        nodes = self.nodes
+        max_depth = self.max_depth
+        # 当前的调用树节点、当前节点的子节点已用的时间、深度
+        state = [frame, 0.0, 0]
+        active = {}
+
+        def visit(node):
+            name = type(node).__name__
+            parent, parent_children, depth = state
+            current = parent.child(name) if depth < max_depth else parent
+            state[0] = current
+            state[1] = 0.0
+            state[2] = depth + 1
+            active[name] = active.get(name, 0) + 1
+            start = clock()
+            try:
+                return inner(node)
+            finally:
+                elapsed = clock() - start
+                own = elapsed - state[1]
+                record = nodes.get(name)
+                if record is None:
+                    record = nodes[name] = [0, 0.0, 0.0]
+                record[0] += 1
+                record[2] += own
+                active[name] -= 1
+                if not active[name]:
+                    record[1] += elapsed
+                current.time += own
+                state[0] = parent
+                state[1] = parent_children + elapsed
+                state[2] = depth
+
+        visitor.visit = visit
+
+        def restore():
+            del visitor.visit
+        return restore
+
+    def profile(self, interpreter):
+        """
+        run interpreter like Interpreter.interpret() and record it; return interpret()'s result.
+        只适用于遍历语法树求值的 Interpreter / SlotInterpreter；编译执行的解释器 eval 阶段只有总时间。
+        """
+        with self.phase('parse') as frame:
+            # Parser 构造时已经读了第一个 token
+            self.tokens += 1
+            restore = self.instrument_lexer(interpreter.parser.analyzer, frame)
+            try:
+                tree = interpreter.parser.parse()
+            finally:
+                restore()
+        with self.phase('symbol'):
+            interpreter.check(tree)
+        if interpreter.passes:
+            with self.phase('optimize'):
+                for optimize in interpreter.passes:
+                    tree = optimize(tree)
+        interpreter.tree = tree
+        # 这里不记录每条语句的值，update() 时依赖图自己重算
+        interpreter.values = None
+        interpreter.graph = None
+        with self.phase('eval') as frame:
+            restore = self.instrument_visitor(interpreter, frame)
+            try:
+                return interpreter.visit(tree)
+            finally:
+                restore()
+
+    def as_dict(self):
+        phases = dict(self.phases)
+        if 'parse' in phases and 'lex' in phases:
+            phases['parse'] -= phases['lex']
+        front_end = phases.get('lex', 0.0) + phases.get('parse', 0.0)
+        return {
+            'phases': {name: phases[name] for name in PHASES if name in phases},
+            'total': sum(phases.values()),
+            'tokens': self.tokens,
+            # 前端（词法 + 语法分析）每秒处理的 token 数
+            'tokens_per_second': self.tokens / front_end if front_end else None,
+            'nodes': {name: {'count': count, 'total': total, 'self': own}
+                      for name, (count, total, own) in sorted(self.nodes.items())},
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.as_dict(), **kwargs)
+
+    def collapsed(self):
+        """flame graph collapsed stacks, one 'frame;frame;frame microseconds' line per call path"""
+        lines = []
+        stack = [(self.root, self.root.name)]
+        while stack:
+            frame, path = stack.pop()
+            micros = int(round(frame.time * 1e6))
+            if micros > 0:
+                lines.append('{} {}'.format(path, micros))
+            for name, child in sorted(frame.children.items(), reverse=True):
+                stack.append((child, path + ';' + name))
+        return '\n'.join(lines) + '\n' if lines else ''
+
+    def report(self):
+        """human readable summary"""
+        data = self.as_dict()
+        lines = ['{:<10} {:>10.6f}s'.format(name, seconds) for name, seconds in data['phases'].items()]
+        lines.append('{:<10} {:>10.6f}s'.format('total', data['total']))
+        if data['tokens_per_second']:
+            lines.append('{} tokens, {:.0f} tokens/s'.format(data['tokens'], data['tokens_per_second']))
+        lines.append('{:<10} {:>10} {:>12} {:>12}'.format('node', 'count', 'total', 'self'))
+        for name, record in sorted(data['nodes'].items(), key=lambda item: -item[1]['self']):
+            lines.append('{:<10} {:>10} {:>11.6f}s {:>11.6f}s'.format(name, record['count'], record['total'],
+                                                                      record['self']))
+        return '\n'.join(lines)
@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@file: spi_server.py
+@author: amazing coder
+@date: 2026/10/18
+@desc: asyncio 求值服务，协议是按行分隔的 JSON
+request  : {"id": 1, "source": "a = 1\\nb = a * 2", "kind": "bytecode"}      kind 可以省略
+response : {"id": 1, "ok": true, "scope": {"a": 1, "b": 2}}         inf / nan 写成字符串 "inf"、"-inf"、"nan"
+           {"id": 2, "ok": false, "error": "NameError: 'c'"}
+同一个连接上可以连续发送多个请求，响应按完成的先后顺序返回，用 id 对应。
+- 求值在进程池中执行，事件循环只负责收发
+- 同时在执行的相同源码只算一次，结果共享 (coalescing)
+- 排队的请求攒成一批交给进程池，减少进程间通信的次数 (batching)
+- 正在处理的请求数达到 max_pending 时不再读取新的请求，压力传回给客户端的 TCP 发送窗口 (backpressure)
+eg:
+python spi_server.py serve --port 8765
+python spi_server.py load --port 8765 --connections 32 --requests 20000
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from spi_batch import dumps_record, evaluate_source
+from spi_cache import COMPILERS
+
+
+def evaluate_batch(items):
+    """worker side: evaluate [(source, kind)], return one result dict per item"""
+    results = []
+    for text, kind in items:
+        try:
+            results.append({'ok': True, 'scope': evaluate_source(text, kind)})
+        except Exception as e:
+            results.append({'ok': False, 'error': '{}: {}'.format(type(e).__name__, e)})
+    return results
+
+
+class EvaluationServer(object):
+    """
+    max_pending : 所有连接上正在处理的请求数上限
+    max_batch   : 一次交给进程池的不同源码的最大数目
+    batch_delay : 收到第一个请求后再等多久攒一批，0 表示只取已经在排队的
+    max_line    : 一行请求的最大字节数，超过时返回错误并关闭连接
+    executor    : 执行求值的 concurrent.futures 执行器，默认 ProcessPoolExecutor(workers)。
+                  默认的进程池用 forkserver 启动工作进程（没有时用 spawn）：进程池是在已经接受了连接之后
+                  才按需创建进程的，fork 出来的子进程会继承客户端的 socket，服务端关闭连接时客户端收不到 EOF
+    """
+    def __init__(self, workers=None, max_pending=1024, max_batch=64, batch_delay=0.0, max_line=1 << 20,
+                 executor=None):
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self.batch_delay = batch_delay
+        self.max_line = max_line
+        if executor is None:
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(method))
+        self.executor = executor
+        self.stats = {'requests': 0, 'coalesced': 0, 'batches': 0, 'evaluated': 0}
+        self._inflight = {}
+        self._queue = None
+        self._slots = None
+        self._batcher = None
+        self._batches = set()
+        self._server = None
+
+    async def start(self, host='127.0.0.1', port=8765, path=None):
+        """listen on host:port, or on the unix socket path when given"""
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_pending)
+        self._batcher = asyncio.ensure_future(self._batch_loop())
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self.handle_connection, path=path, limit=self.max_line)
+        else:
+            self._server = await asyncio.start_server(self.handle_connection, host, port, limit=self.max_line)
+        return self._server
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+        self._batcher.cancel()
+        for task in list(self._batches):
+            task.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def evaluate(self, text, kind='bytecode'):
+        """evaluate text in the worker pool; identical requests already in flight share one evaluation"""
+        self.stats['requests'] += 1
+        key = (text, kind)
+        future = self._inflight.get(key)
+        if future is None:
+            future = self._inflight[key] = asyncio.get_running_loop().create_future()
+            self._queue.put_nowait(key)
+        else:
+            self.stats['coalesced'] += 1
+        # shield：一个等待者被取消（比如连接断开）不影响其他共享这个结果的请求
+        return await asyncio.shield(future)
+
+    async def _batch_loop(self):
+        while True:
+            batch = [await self._queue.get()]
+            if self.batch_delay:
+                await asyncio.sleep(self.batch_delay)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            # 保留任务的引用，否则任务可能在执行中被回收；异常交给事件循环的异常处理
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batch_done)
+
+    def _batch_done(self, task):
+        self._batches.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            task.get_loop().call_exception_handler({
+                'message': 'evaluation batch failed', 'exception': task.exception(), 'task': task})
+
+    async def _run_batch(self, batch):
+        self.stats['batches'] += 1
+        self.stats['evaluated'] += len(batch)
+        loop = asyncio.get_running_loop()
+        try:
+            try:
+                results = await loop.run_in_executor(self.executor, evaluate_batch, batch)
+            except Exception as e:
+                results = [{'ok': False, 'error': '{}: {}'.format(type(e).__name__, e)}] * len(batch)
+            for key, result in zip(batch, results):
+                future = self._inflight.pop(key)
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            # 出错或者被取消时，不能让等待这一批结果的请求永远挂起
+            for key in batch:
+                future = self._inflight.pop(key, None)
+                if future is not None and not future.done():
+                    future.set_result({'ok': False, 'error': 'evaluation batch was not completed'})
+
+    async def handle_request(self, line):
+        """one request line -> response dict; errors echo the request id whenever it could be parsed"""
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('request must be a JSON object')
+            request_id = request.get('id')
+            text = request['source']
+            kind = request.get('kind', 'bytecode')
+            if not isinstance(text, str) or kind not in COMPILERS:
+                raise ValueError('source must be a string and kind one of {}'.format(sorted(COMPILERS)))
+        except (ValueError, KeyError) as e:
+            return {'id': request_id, 'ok': False, 'error': 'bad request: {}: {}'.format(type(e).__name__, e)}
+        response = {'id': request_id}
+        response.update(await self.evaluate(text, kind))
+        return response
+
+    async def handle_connection(self, reader, writer):
+        lock = asyncio.Lock()
+        tasks = set()
+
+        async def serve(line):
+            try:
+                response = await self.handle_request(line)
+                try:
+                    data = dumps_record(response)
+                except (ValueError, TypeError) as e:
+                    # 写不出来的响应也要回复，否则客户端会一直等这个 id
+                    data = json.dumps({'id': response.get('id'), 'ok': False,
+                                       'error': '{}: {}'.format(type(e).__name__, e)})
+                async with lock:
+                    writer.write(data.encode('utf-8') + b'\n')
+                    await writer.drain()
+            except ConnectionError:
+                pass
+            finally:
+                self._slots.release()
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError) as e:
+                    if isinstance(e, ValueError):
+                        async with lock:
+                            writer.write(b'{"id": null, "ok": false, "error": "request line too long"}\n')
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                # 读到请求之后才占用名额，空闲的连接不占名额；名额用完时停在这里，不再读取这个连接上的请求
+                await self._slots.acquire()
+                task = asyncio.ensure_future(serve(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+async def load_test(sources, requests=1000, connections=16, host='127.0.0.1', port=8765, path=None):
+    """
+    压测客户端：connections 个连接各自循环发送请求（发一个、等响应、再发下一个），
+    sources 轮流使用。返回请求数、耗时、吞吐量、p50/p99 延迟（秒）和失败数。
+    """
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def client():
+        nonlocal errors
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path, limit=1 << 24)
+        else:
+            reader, writer = await asyncio.open_connection(host, port, limit=1 << 24)
+        try:
+            for request_id in counter:
+                line = json.dumps({'id': request_id, 'source': sources[request_id % len(sources)]})
+                start = time.perf_counter()
+                writer.write(line.encode('utf-8') + b'\n')
+                await writer.drain()
+                response = json.loads(await reader.readline())
+                latencies.append(time.perf_counter() - start)
+                if not response['ok']:
+                    errors += 1
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(connections)))
+    seconds = time.perf_counter() - start
+    latencies.sort()
+    return {'requests': len(latencies), 'seconds': seconds, 'throughput': len(latencies) / seconds,
+            'p50': percentile(latencies, 0.5), 'p99': percentile(latencies, 0.99), 'errors': errors}
+
+
+def generate_sources(distinct, statements):
+    return ['\n'.join('v{} = v{} * {} + {}'.format(j, j - 1, i % 7 + 2, j) if j else 'v0 = {}'.format(i)
+                      for j in range(statements)) for i in range(distinct)]
+
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(description='Evaluation server speaking line-delimited JSON.')
+    commands = argparser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help='run the server')
+    load = commands.add_parser('load', help='generate load against a running server')
+    for command in (serve, load):
+        command.add_argument('--host', default='127.0.0.1')
+        command.add_argument('--port', type=int, default=8765)
+        command.add_argument('--unix', default=None, help='unix socket path instead of TCP')
+    serve.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    serve.add_argument('--max-pending', type=int, default=1024)
+    serve.add_argument('--max-batch', type=int, default=64)
+    serve.add_argument('--batch-delay', type=float, default=0.0, help='seconds to wait while filling a batch')
+    load.add_argument('--requests', type=int, default=10000)
+    load.add_argument('--connections', type=int, default=16)
+    load.add_argument('--distinct', type=int, default=50, help='number of different programs to send')
+    load.add_argument('--statements', type=int, default=50, help='statements per generated program')
+    args = argparser.parse_args(argv)
+
+    if args.command == 'load':
+        results = asyncio.run(load_test(generate_sources(args.distinct, args.statements), args.requests,
+                                        args.connections, args.host, args.port, args.unix))
+        print(json.dumps(results))
+        return
+
+    async def serve_forever():
+        server = EvaluationServer(args.workers, args.max_pending, args.max_batch, args.batch_delay)
+        listener = await server.start(args.host, args.port, args.unix)
+        print('listening on {}'.format(args.unix or '{}:{}'.format(args.host, args.port)), file=sys.stderr)
+        try:
+            await listener.serve_forever()
+        finally:
+            print(json.dumps(server.stats), file=sys.stderr)
+            await server.close()
+
+    try:
+        asyncio.run(serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@file: spi_session.py
+@author: amazing coder
+@date: 2026/10/18
+@desc: 交互式 / 嵌入式会话：变量和符号表在多次提交之间保留，每次只对新提交的文本做词法、语法分析
+eg:
+session = Session()
+session.submit('a = 1')           # {'a': 1}
+session.submit('b = a * 2 \\n c = b + a')
+session.scope                     # {'a': 1, 'b': 2, 'c': 3}
+"""
+
+import sys
+
+from interpreter import EOF, ID, REPL, Interpreter
+from spi_lexer import RegexAnalyzer
+from spi_parser import CheckingPrattParser
+from spi_symbol import SymbolTable
+
+
+class Session(object):
+    """
+    每次 submit 的文本可以包含多条语句，语句之间可以用空白或者 \\n (REPL token) 分隔。
+    整段文本先解析完再执行：语法错误或未定义变量时这段文本一条都不执行，新定义的符号也会撤销。
+    执行到一半出错（比如除数为 0）时，前面的语句已经生效，与 python 交互环境执行多行代码一样。
+    """
+    def __init__(self, parser_class=CheckingPrattParser, lexer_class=RegexAnalyzer):
+        self.parser_class = parser_class
+        self.lexer_class = lexer_class
+        self.symtab = SymbolTable(None)
+        self.interpreter = Interpreter(None)
+        self.interpreter.trace = None
+        self.statements = 0
+
+    @property
+    def scope(self):
+        return self.interpreter.GLOBAL_SCOPE
+
+    def parse(self, text):
+        """parse only text, checking symbols against the session's symbol table"""
+        parser = self.parser_class(self.lexer_class(text), symtab=self.symtab)
+        statements = []
+        while True:
+            token_type = parser.current_token.type
+            if token_type == REPL:
+                parser.eat(REPL)
+            elif token_type == ID:
+                statements.append(parser.assignment_statement())
+            elif token_type == EOF:
+                return statements
+            else:
+                parser.error()
+
+    def submit(self, text):
+        """parse and run text, return the variables it assigned {name: value}"""
+        size = len(self.symtab)
+        try:
+            statements = self.parse(text)
+        except Exception:
+            self.symtab.rollback(size)
+            raise
+        assigned = {}
+        scope = self.interpreter.GLOBAL_SCOPE
+        for statement in statements:
+            self.interpreter.visit(statement)
+            self.statements += 1
+            var_name = statement.left.value
+            assigned[var_name] = scope[var_name]
+        return assigned
+
+
+def main():
+    """read-eval-print loop on stdin"""
+    session = Session()
+    interactive = sys.stdin.isatty()
+    while True:
+        if interactive:
+            sys.stdout.write('>>> ')
+            sys.stdout.flush()
+        line = sys.stdin.readline()
+        if not line:
+            break
+        try:
+            for var_name, val in session.submit(line).items():
+                print('{} = {!r}'.format(var_name, val))
+        except Exception as e:
+            print('{}: {}'.format(type(e).__name__, e))
+    if interactive:
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,8 @@
 @date: 2024/8/31
 @desc: 增加通用符号类
 """
+from itertools import islice
+
 
 class Symbol(object):
     def __int__(self, name, type=None):
@@ -28,6 +30,8 @@ class VarSymbol(Symbol):
     def __init__(self, name, type=None):
         # python 定义时可以不指定类型
         super().__int__(name, type)
+        # 由 SymbolTable.define 分配的槽位号
+        self.slot = None
 
     def __str__(self):
         return f'VarSymbol:name={self.name}: type={str(self.symbol_type)}'
@@ -36,8 +40,13 @@ class VarSymbol(Symbol):
 
 
 class SymbolTable(object):
-    def __init__(self):
+    def __init__(self, trace=print):
+        """
+        trace 是 define/lookup 时的诊断输出回调，比如 print 或者 logging.getLogger(...).debug；
+        传 None 则关闭，既不格式化字符串也不做任何 I/O
+        """
         self._symbols = {}
+        self.trace = trace
 
     def __str__(self):
         return 'Symbols: {symbols}'.format(symbols=[value for value in self._symbols.values()])
@@ -45,15 +54,37 @@ class SymbolTable(object):
     __repr__ = __str__
 
     def define(self, symbol):
-        print('Define: %s' % symbol)
+        if self.trace is not None:
+            self.trace('Define: %s' % symbol)
+        # 每个变量名分配一个连续的槽位号，重新定义时沿用原来的槽位
+        previous = self._symbols.get(symbol.name)
+        symbol.slot = len(self._symbols) if previous is None else previous.slot
         self._symbols[symbol.name] = symbol
         return symbol
 
     def lookup(self, name):
-        print('Lookup: %s' % name)
+        if self.trace is not None:
+            self.trace('Lookup: %s' % name)
         symbol = self._symbols.get(name)
         return symbol
 
+    def __len__(self):
+        return len(self._symbols)
+
+    def rollback(self, size):
+        """forget the symbols defined after the table had `size` entries (new names are always the newest keys)"""
+        while len(self._symbols) > size:
+            self._symbols.popitem()
+
+    def slot_names(self, start=0):
+        """variable names ordered by slot, from slot start on"""
+        if not start:
+            return list(self._symbols)
+        # 新定义的名字总在最后，从后往前取，代价与新名字的个数成正比
+        names = list(islice(reversed(self._symbols), max(len(self._symbols) - start, 0)))
+        names.reverse()
+        return names
+
 
 def test_class():
     int_type = BuiltinTypeSymbol('INTEGER')
@@ -8,6 +8,9 @@
 @desc: 
 """
 class Token(object):
+    # token 数量很多，不需要 __dict__
+    __slots__ = ('type', 'value')
+
     def __init__(self, type, value):
         self.type = type
         self.value = value
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@file: spi_vector.py
+@author: amazing coder
+@date: 2026/10/18
+@desc: 向量化求值：输入变量绑定到一整列参数（NumPy 数组），每个 BinOp/UnaryOp 只执行一次数组运算
+eg: inputs = {'a': [1, 2, 3]}
+a = 1
+b = a * 2 + 1      ==>  GLOBAL_SCOPE = {'a': array([1, 2, 3]), 'b': array([3, 5, 7])}
+没有安装 NumPy 时退回到逐行执行编译好的闭包，GLOBAL_SCOPE 的每一项是一列 list
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from abs_syntax_tree import Assign, Compound
+from interpreter import DIV, Interpreter
+from spi_closure import ClosureCompiler
+
+
+class VectorInterpreter(Interpreter):
+    """
+    inputs 是 {变量名: 一列值}。与 Interpreter.update 一样，输入列替换变量的第一次赋值（输入），
+    后面再给它赋值的语句照常执行。其余变量的结果都是与输入列等长的一列：
+    有 NumPy 时是数组（只读的广播视图），退回逐行执行时是 list；两种情况下每一行的值都相同。
+    除法与标量解释器一致：除数中有 0 就抛 ZeroDivisionError，而不是得到 inf/nan。
+    注意 NumPy 的整数是定长的，超出 int64 时会回绕，标量解释器则是任意精度整数。
+    """
+    def __init__(self, parser, inputs, passes=()):
+        super().__init__(parser, passes)
+        self.inputs = inputs
+
+    def visit_BinOp(self, node):
+        if node.token.type != DIV:
+            return super().visit_BinOp(node)
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        if np.any(right == 0):
+            raise ZeroDivisionError('division by zero')
+        return left / right
+
+    def statements(self, tree):
+        """the statements left to run once the first assignment to each input variable is dropped"""
+        inputs = set(self.inputs)
+        statements = []
+        for child in tree.children:
+            if isinstance(child, Assign) and child.left.value in inputs:
+                inputs.discard(child.left.value)
+                continue
+            statements.append(child)
+        for var_name in inputs:
+            raise NameError(repr(var_name))
+        return statements
+
+    def interpret(self):
+        tree = self.parser.parse()
+        self.check(tree)
+        for optimize in self.passes:
+            tree = optimize(tree)
+        statements = self.statements(tree)
+        if np is None:
+            return self.run_rows(statements)
+        columns = {var_name: np.asarray(column) for var_name, column in self.inputs.items()}
+        # np.broadcast 最多只接受 32 个参数
+        shape = np.broadcast_shapes(*(np.shape(column) for column in columns.values()))
+        self.GLOBAL_SCOPE = columns
+        for statement in statements:
+            self.visit(statement)
+        # 只依赖常量的变量算出来是标量，也展开成一整列
+        self.GLOBAL_SCOPE = {var_name: np.broadcast_to(value, shape) for var_name, value in self.GLOBAL_SCOPE.items()}
+
+    def run_rows(self, statements):
+        """NumPy 不可用时逐行执行，每行都有与标量解释器完全相同的语义"""
+        rows = len(next(iter(self.inputs.values()))) if self.inputs else 1
+        for var_name, column in self.inputs.items():
+            if len(column) != rows:
+                raise ValueError('input {!r} has {} rows, expected {}'.format(var_name, len(column), rows))
+        compound = Compound()
+        compound.children = statements
+        program = ClosureCompiler().compile(compound)
+        self.GLOBAL_SCOPE = {}
+        for row in range(rows):
+            scope = {var_name: column[row] for var_name, column in self.inputs.items()}
+            program(scope)
+            for var_name, val in scope.items():
+                self.GLOBAL_SCOPE.setdefault(var_name, []).append(val)